@@ -4,35 +4,34 @@
 import tkinter as tk
 import os
 import sys
-from time import sleep
+from time import perf_counter
 from tkinter import messagebox as mb
 from tkinter import filedialog as fd
 from tkinter import ttk
-from threading import Thread
 
-from moxa_ser_lib import Connection
+from moxa_ser_lib import event_severity, parse_eventlog
 
 # from moxa_ser_test import Connection
 from moxa_csv_lib import ConfigFile
-
-moxa_switch = Connection(verbose=True)
-
-
-def threaded(func):
-    """
-    Decorate functions.
-
-    Decorator that multithreads the target function
-    with the given parameters. Returns the thread
-    created for the function
-    """
-
-    def wrapper(*args, **kwargs):
-        thread = Thread(target=func, args=args, kwargs=kwargs)
-        thread.start()
-        return thread
-
-    return wrapper
+from moxa_journal_lib import FINISHED, SUFFIX, JobJournal, target
+from moxa_model_lib import DEFAULT, alarm_array
+from moxa_mux_lib import held, open_connection
+from moxa_sql_lib import SqlConfigFile
+from moxa_conf_lib import hostname
+from moxa_prov_lib import NO_ANSWER, alarm_ports, login, reconcile
+from moxa_worker_lib import PortMonitor, SerialWorker
+
+START = perf_counter()
+DEVICE = "/dev/ttyUSB0"
+VERBOSE = True  # Trace the console dialog and startup time on stdout
+FIRMWARE_JOURNAL = "./site/firmware" + SUFFIX  # Firmware transfers, for reports
+POLL_MS = 50  # How often the GUI collects results from the serial worker
+TREE_CHUNK = 200  # Treeview rows inserted per idle callback
+RETRY_MS = 2000  # Wait before the next login try
+STARTUP_BUDGET = 0.5  # Seconds from start until the window is shown
+PORT_POLL_S = 2.0  # Seconds between link status polls
+LOG_MAX_LINES = 2000  # Event log lines kept in the LogView widget
+LOG_FOLLOW_MS = 5000  # Event log reread interval while following
 
 
 class MoxaGUI(tk.Tk):
@@ -45,47 +44,116 @@ class MoxaGUI(tk.Tk):
         self.resizable(False, False)
         # self.bind("<Escape>", lambda _: self.destroy())
         self.bind("<Escape>", lambda _: self.show_frame(MainPage))
-        container = tk.Frame(self)
-        container.pack(side="top", fill="both", expand=True)
-
-        def login() -> None:
-            logincheck = moxa_switch.check_login()
-            if logincheck == 0:
-                moxa_switch.menu_login()
-                moxa_switch.reset_conn()
-                sleep(2)
-                moxa_switch.cli_login()
-            elif logincheck == 1:
-                moxa_switch.cli_login()
-            else:
-                return
-
-        login()  # Do first login
-
-        self.frames = {}
-        for F in (MainPage, AutoConf, LogView, Firmware):
-            frame = F(container, self)
-            self.frames[F] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
-
+        self.status = tk.Label(self, text="", anchor="w")
+        self.status.pack(side="bottom", fill="x")
+        self.container = tk.Frame(self)
+        self.container.pack(side="top", fill="both", expand=True)
+        # All console I/O runs on the worker, results come back in poll().
+        # The port is opened by the worker, so a missing switch never
+        # keeps the window from showing.
+        self.worker = SerialWorker(
+            errback=self.show_error,
+            factory=lambda: open_connection(DEVICE, verbose=VERBOSE),
+        )
+        self.monitor = PortMonitor(self.worker, interval=PORT_POLL_S)
+        self.profile = DEFAULT  # Model profile of the connected switch
+        self.logged_in = False
+        self.current = None
+        self.bind("<Map>", self.shown, add="+")
+
+        self.frames = {}  # Built on first use by show_frame
         self.show_frame(MainPage)
+        self.connect()
+        self.poll()
+
+    def close(self) -> None:
+        """Close the window, so frames write what they hold, and exit."""
+        self.destroy()
+        sys.exit(0)
+
+    def shown(self, event) -> None:
+        """Report the time until the window was first shown."""
+        if event.widget is not self:
+            return
+        self.unbind("<Map>")
+        if not VERBOSE:
+            return
+        elapsed = perf_counter() - START
+        print(f"Moxa Configurator: window shown after {elapsed * 1000:.0f} ms")
+        if elapsed > STARTUP_BUDGET:
+            print(f"Moxa Configurator: over the {STARTUP_BUDGET} s startup budget")
+
+    def connect(self) -> None:
+        """Log in on the worker."""
+        self.status.config(text=f"Connecting to {DEVICE}...")
+        self.worker.submit(login, callback=self.connected, errback=self.retry)
+
+    def connected(self, logincheck: int) -> None:
+        """Refresh the current frame once logged in."""
+        if logincheck == NO_ANSWER:
+            self.retry(f"no switch answering on {DEVICE}")
+            return
+        self.logged_in = True
+        self.watch_ports()
+        self.status.config(text=f"Connected on {DEVICE}")
+        frame = self.frames[self.current]
+        if frame.needs_login:
+            frame.refresh()
+
+    def retry(self, error) -> None:
+        """Show why login failed and try again."""
+        self.status.config(text=f"Not connected: {error}, retrying...")
+        self.after(RETRY_MS, self.connect)
+
+    def poll(self) -> None:
+        """Deliver worker results and show the busy cursor."""
+        try:
+            self.worker.poll()
+            self.monitor.tick()
+            cursor = "watch" if self.worker.busy() else ""
+            if self.cget("cursor") != cursor:
+                self.config(cursor=cursor)
+        finally:
+            self.after(POLL_MS, self.poll)
+
+    def show_error(self, error: Exception) -> None:
+        """Show an error raised by a worker job."""
+        mb.showerror(title="Error", message=f"Something went wrong: {error}")
 
     def show_frame(self, cont):
-        """Raise frames."""
-        self.config(cursor="watch")
+        """Raise frames, building them on first use."""
+        if cont not in self.frames:
+            frame = cont(self.container, self)
+            self.frames[cont] = frame
+            frame.grid(row=0, column=0, sticky="nsew")
         frame = self.frames[cont]
+        self.current = cont
         # frame.update()
         frame.tkraise()
-        frame.refresh()
-        self.config(cursor="")
+        self.watch_ports()
+        if self.logged_in or not frame.needs_login:
+            frame.refresh()
+
+    def watch_ports(self) -> None:
+        """Poll link status only while MainPage shows it."""
+        if self.logged_in and self.current is MainPage:
+            self.monitor.start()
+        else:
+            self.monitor.stop()
 
 
 class MainPage(tk.Frame):
     """Main Frame."""
 
+    needs_login = True
+
     def __init__(self, parent, controller):
         """Initialize the class."""
         tk.Frame.__init__(self, parent)
+        self.controller = controller
+        self.worker = controller.worker
+        self.monitor = controller.monitor
+        self.system = []  # type: list[str]
         self.frame0 = tk.Frame(self)  # Hostname etc
         self.frame0.grid(row=0, column=0, sticky="nw")
         self.frame1 = tk.Frame(self)  # Ports
@@ -93,16 +161,8 @@ class MainPage(tk.Frame):
         self.frame2 = tk.Frame(self)  # Buttons
         self.frame2.grid(row=1, column=0, sticky="s", padx=3, pady=5)
 
-        self.alobjports = [
-            tk.IntVar(),
-            tk.IntVar(),
-            tk.IntVar(),
-            tk.IntVar(),
-            tk.IntVar(),
-            tk.IntVar(),
-            tk.IntVar(),
-            tk.IntVar(),
-        ]
+        self.alobjports = []  # type: list[tk.IntVar]
+        self.portbuttons = []  # type: list[tk.Checkbutton]
 
         tk.Label(self.frame0, text="Name: ").grid(
             row=0, column=0, sticky="w", padx=5, pady=1
@@ -151,63 +211,9 @@ class MainPage(tk.Frame):
         self.upd_btn3 = tk.Button(self.frame0, text="Update", command=self.upd_ip)
         self.upd_btn3.grid(row=7, column=2)
 
-        tk.Label(self.frame1, text="Ports:").grid(row=0, column=0, columnspan=4)
-        self.port_1 = tk.Checkbutton(
-            self.frame1,
-            text="1",
-            variable=self.alobjports[0],
-            command=lambda: self.p_refresh(),
-        )
-        self.port_1.grid(row=5, column=1, padx=0)
-        self.port_2 = tk.Checkbutton(
-            self.frame1,
-            text="2",
-            variable=self.alobjports[1],
-            command=lambda: self.p_refresh(),
-        )
-        self.port_2.grid(row=5, column=3, padx=0)
-        self.port_3 = tk.Checkbutton(
-            self.frame1,
-            text="3",
-            variable=self.alobjports[2],
-            command=lambda: self.p_refresh(),
-        )
-        self.port_3.grid(row=4, column=1, padx=0)
-        self.port_4 = tk.Checkbutton(
-            self.frame1,
-            text="4",
-            variable=self.alobjports[3],
-            command=lambda: self.p_refresh(),
-        )
-        self.port_4.grid(row=4, column=3, padx=0)
-        self.port_5 = tk.Checkbutton(
-            self.frame1,
-            text="5",
-            variable=self.alobjports[4],
-            command=lambda: self.p_refresh(),
-        )
-        self.port_5.grid(row=3, column=1, padx=0)
-        self.port_6 = tk.Checkbutton(
-            self.frame1,
-            text="6",
-            variable=self.alobjports[5],
-            command=lambda: self.p_refresh(),
-        )
-        self.port_6.grid(row=3, column=3, padx=0)
-        self.port_7 = tk.Checkbutton(
-            self.frame1,
-            text="7",
-            variable=self.alobjports[6],
-            command=lambda: self.p_refresh(),
-        )
-        self.port_7.grid(row=2, columnspan=4, padx=0)
-        self.port_8 = tk.Checkbutton(
-            self.frame1,
-            text="8",
-            variable=self.alobjports[7],
-            command=lambda: self.p_refresh(),
-        )
-        self.port_8.grid(row=1, columnspan=4, padx=0)
+        self.portlabel = tk.Label(self.frame1, text="Ports:")
+        self.build_ports(controller.profile)
+        self.monitor.subscribe(self.portcolor)
 
         button1 = tk.Button(
             self.frame2, text="download config", command=self.download_config
@@ -238,24 +244,42 @@ class MainPage(tk.Frame):
         button6 = tk.Button(self.frame2, text="copy ram2rom", command=self.apply)
         button6.grid(row=1, column=2)
 
+    def build_ports(self, profile: dict) -> None:
+        """Create one alarm checkbutton per port, placed as on the front panel."""
+        for button in self.portbuttons:
+            button.destroy()
+        self.alobjports = [tk.IntVar() for _ in range(profile["ports"])]
+        self.portbuttons = []
+        for count, (row, column, span) in enumerate(profile["layout"]):
+            button = tk.Checkbutton(
+                self.frame1,
+                text=str(count + 1),
+                variable=self.alobjports[count],
+                command=lambda: self.p_refresh(),
+            )
+            button.grid(row=row, column=column, columnspan=span, padx=0)
+            self.portbuttons.append(button)
+        width = max(column + span for _, column, span in profile["layout"])
+        self.portlabel.grid(row=0, column=0, columnspan=max(4, width))
+
     def p_refresh(self):
         """Refresh port values."""
-        self.config(cursor="watch")
         templist = []
         for port in self.alobjports:
             templist.append(port.get())
-        moxa_switch.conf_iface(templist)
+        self.worker.submit(lambda conn: conn.conf_iface(templist))
         self.refresh()
 
-    def portcolor(self) -> list:
-        """Set background colors of connected ports."""
-        pcol = ["", "", "", "", "", "", "", "", ""]
-        for count, port in enumerate(self.stintports):
+    def portcolor(self, changes: dict) -> None:
+        """Set background colors of ports whose link status changed."""
+        for count, port in changes.items():
+            if count >= len(self.portbuttons):
+                continue
             if port == "Up":
-                pcol[count] = "#000fff000"  # Green
+                pcol = "#000fff000"  # Green
             else:
-                pcol[count] = "#D9D9D9"  # Same as background
-        return pcol
+                pcol = "#D9D9D9"  # Same as background
+            self.portbuttons[count].config(background=pcol)
 
     def portalarms(self) -> list:
         """Set status of alarms on ports."""
@@ -269,54 +293,103 @@ class MainPage(tk.Frame):
 
     def factory_reset(self):
         """Reset switch to factory settings."""
-        self.config(cursor="watch")
         if mb.askokcancel(title="Warning", message="Do you wish to proceed?"):
-            moxa_switch.factory_conf()
-            sys.exit(0)
+            self.worker.submit(
+                lambda conn: conn.factory_conf(),
+                callback=lambda _: self.controller.close(),
+            )
 
     def download_config(self):
         """Download the switch running config."""
-        initial_file = moxa_switch.get_sysinfo()[0]
+        if self.system:
+            self.ask_config_file(self.system[0])
+            return
+        self.worker.submit(
+            lambda conn: conn.get_sysinfo()[0], callback=self.ask_config_file
+        )
+
+    def ask_config_file(self, initial_file: str) -> None:
+        """Ask where to save the config and download it."""
         filename = fd.asksaveasfilename(
             defaultextension=".ini",
             initialdir="./site/configs/",
             initialfile=initial_file,
         )
-        if filename != ():
-            contents = moxa_switch.save_config()
-            with open(filename, "w") as config:
-                config.write(contents)
+        if filename:
+            self.worker.submit(self.save_config, filename)
+
+    @staticmethod
+    def save_config(conn, filename: str) -> None:
+        """Write the switch config to filename (worker thread)."""
+        with open(filename, "wb") as config:
+            conn.stream_config(config)
 
     def apply(self):
         """Save the running config to startup config."""
-        if moxa_switch.save_run2startup():
+        self.worker.submit(
+            lambda conn: conn.save_run2startup(), callback=self.show_applied
+        )
+
+    def show_applied(self, status: bool) -> None:
+        """Show the result of the save."""
+        if status:
             mb.showinfo(message="Success")
         else:
             mb.showerror(title="Error", message="Something went wrong")
 
     def upd_name(self):
         """Write the new hostname."""
-        moxa_switch.conf_hostname(self.swname.get())
+        hostname = self.swname.get()
+
+        def renamed(_) -> None:
+            """Use the new name for downloads once the switch took it."""
+            if self.system:
+                self.system[0] = hostname
+
+        self.worker.submit(lambda conn: conn.conf_hostname(hostname), callback=renamed)
 
     def upd_loc(self):
         """Write the new location."""
-        moxa_switch.conf_location(self.swloc.get())
+        location = self.swloc.get()
+        self.worker.submit(lambda conn: conn.conf_location(location))
 
     def upd_ip(self):
         """Write the new IP address."""
-        moxa_switch.conf_ip(self.swip.get())
+        ip_add = self.swip.get()
+        self.worker.submit(lambda conn: conn.conf_ip(ip_add))
 
     def refresh(self) -> None:
-        """Read and refresh values on screen."""
-        # Read new values
-        self.system = moxa_switch.get_sysinfo()
-        self.version = moxa_switch.get_version()
-        self.alintports = moxa_switch.get_portconfig()
-        self.stintports = moxa_switch.get_ifaces()
-        self.mgmt_ip = moxa_switch.get_ip()
-        for num, val in enumerate(self.alintports):
-            if val == "Off":
-                self.alobjports[num].set(1)
+        """Read the values from the switch on the worker."""
+        self.worker.submit(self.read_values, callback=self.show_values)
+
+    @staticmethod
+    def read_values(conn) -> tuple:
+        """Read the values shown on the page (worker thread)."""
+        return (
+            conn.detect_profile(),
+            conn.get_sysinfo(),
+            conn.get_version(),
+            conn.get_portconfig(),
+            conn.get_ifaces(),
+            conn.get_ip(),
+        )
+
+    def show_values(self, values: tuple) -> None:
+        """Refresh values on screen."""
+        (
+            profile,
+            self.system,
+            self.version,
+            self.alintports,
+            self.stintports,
+            self.mgmt_ip,
+        ) = values
+        if profile["model"] != self.controller.profile["model"]:
+            self.controller.profile = profile
+            self.build_ports(profile)
+            self.monitor.state = None  # New buttons, color them all
+        for var, alarm in zip(self.alobjports, alarm_array(self.alintports)):
+            var.set(alarm)
         # Delete old values
         self.swname.delete(0, tk.END)
         self.swloc.delete(0, tk.END)
@@ -343,26 +416,24 @@ class MainPage(tk.Frame):
         self.swswv.insert(tk.END, self.version[1])
         self.swswv.config(bg="#D9D9D9", relief=tk.FLAT, state=tk.DISABLED)
         self.swip.insert(tk.END, self.mgmt_ip[2])
-        self.pcol = self.portcolor()
-        self.port_1.config(background=self.pcol[0])
-        self.port_2.config(background=self.pcol[1])
-        self.port_3.config(background=self.pcol[2])
-        self.port_4.config(background=self.pcol[3])
-        self.port_5.config(background=self.pcol[4])
-        self.port_6.config(background=self.pcol[5])
-        self.port_7.config(background=self.pcol[6])
-        self.port_8.config(background=self.pcol[7])
-        self.config(cursor="")
+        # Port colors follow the monitor's change events
+        self.monitor.update(self.stintports)
 
 
 class AutoConf(tk.Frame):
     """Devicewindow GUI for moxa configurator."""
 
+    needs_login = False
+
     def __init__(self, parent, controller) -> None:
         """Initialize the class."""
         tk.Frame.__init__(self, parent)
+        self.controller = controller
+        self.worker = controller.worker
+        self.monitor = controller.monitor
         self.config_file = ConfigFile()
         self.file = ""
+        self.journal = None  # type: JobJournal | None
         self.rowconfigure(0, weight=1)
         self.columnconfigure(0, weight=1)
         self.frame0 = tk.Frame(self)  # Buttons
@@ -371,6 +442,11 @@ class AutoConf(tk.Frame):
         self.frame1.grid(row=1, column=0, sticky="nsew")
         self.frame2 = tk.Frame(self)  # Statusline
         self.frame2.grid(row=2, column=0, sticky="nsew")
+        self.status = ttk.Label(self.frame2, text="")
+        self.status.grid(row=0, column=0)
+        # Rows in the Treeview by item id, and the pending chunked insert
+        self.shown = {}  # type: dict[str, tuple]
+        self.fill_job = None  # type: str | None
         # Treeview
         self.columns = ("cab", "ap", "sw_ip", "loc")
         self.tree = ttk.Treeview(
@@ -425,38 +501,72 @@ class AutoConf(tk.Frame):
         )
         self.return_button.pack(side="left")
 
+    def destroy(self) -> None:
+        """Write pending MAC addresses before closing."""
+        self.config_file.flush()
+        tk.Frame.destroy(self)
+
     def item_selected(self, event) -> None:
         """Get selected value and write config to switch."""
         _ = event  # Hush some editor warnings
-        config = self.tree.item(self.tree.focus())["values"]
-        ports = [0, 0, 0, 0, 0, 0, 0, 0]
-        for count, port in enumerate(moxa_switch.get_ifaces()):
-            if port == "Up":
-                ports[count] = 1
-        if self.swmainred.get() == 0:
-            main_reserve = "M"
-        else:
-            main_reserve = "R"
+        config = self.shown.get(self.tree.focus())
+        if config is None:
+            return
+        main = self.swmainred.get() == 0
+        # Read the links now, the switch may have been swapped meanwhile
+        self.worker.submit(
+            lambda conn: conn.get_ifaces(),
+            callback=lambda ifaces: self.confirm(config, main, ifaces),
+        )
+
+    def confirm(self, config: list, main: bool, ifaces: list) -> None:
+        """Ask before writing the selected config to the switch."""
+        profile = self.controller.profile
+        ports = alarm_ports(ifaces, profile["ports"])
+        name = hostname(config[0], main)
         message = (
-            f"Hostname: {config[0] + main_reserve}\n"
+            f"Hostname: {name}\n"
             f"Location: {config[3]}\n"
             f"IP Address: {config[2]}\n"
             f"Alarm on {ports}"
         )
         if mb.askokcancel(title="Continue?", message=message):
-            moxa_switch.conf_hostname(config[0] + main_reserve)
-            moxa_switch.conf_location(config[3])
-            moxa_switch.conf_ip(config[2])
-            moxa_switch.conf_iface(ports)
-            moxa_switch.save_run2startup()
-            self.config_file.write_config(
-                self.file,
-                config[0],
-                config[1],
-                moxa_switch.get_sysinfo()[4],
-                True if self.swmainred.get() == 0 else False,
+            key = target(config[0], config[1], main)
+            self.worker.submit(
+                self.configure_switch,
+                name,
+                config[3],
+                config[2],
+                ports,
+                None,
+                lambda step, seconds: self.note(key, step, seconds=seconds),
+                profile["names"],
+                callback=lambda mac: self.configured(config, main, mac),
+                errback=lambda error: self.failed(key, error),
             )
-            self.refresh()
+
+    @staticmethod
+    def configure_switch(conn, *args) -> str:
+        """Reconcile the switch, other tools kept off the console (worker thread)."""
+        with held(conn):
+            return reconcile(conn, *args)
+
+    def configured(self, config: list, main: bool, mac: str) -> None:
+        """Record the MAC of a configured switch."""
+        # Written back to the plan in one go by destroy, the journal
+        # keeps the MAC if the GUI dies before that
+        self.config_file.write_config(self.file, config[0], config[1], mac, main)
+        self.note(target(config[0], config[1], main), FINISHED, mac=mac)
+        self.refresh()
+
+    def note(self, key: str, step: str, ok: bool = True, **fields) -> None:
+        """Journal a step of a switch configured from this frame."""
+        self.journal.record(key, step, ok, port=DEVICE, **fields)
+
+    def failed(self, key: str, error: Exception) -> None:
+        """Record and show a failed configuration."""
+        self.note(key, "failed", ok=False, error=str(error))
+        mb.showerror(title="Configuration failed", message=str(error))
 
     def bswitch(self) -> None:
         """Toggle switch On/Off."""
@@ -472,20 +582,73 @@ class AutoConf(tk.Frame):
         """Refresh the values in the frame."""
         if self.file == "":
             file = fd.askopenfilename(
-                initialdir="./site/", filetypes=[("Comma Separated files", ".csv")]
+                initialdir="./site/",
+                filetypes=[
+                    ("Comma Separated files", ".csv"),
+                    ("Site plan database", ".db"),
+                ],
             )
             if file != "":
                 self.file = file
+                self.journal = JobJournal(file + SUFFIX)
+                if file.endswith(".db"):
+                    self.config_file = SqlConfigFile()
+                problems = self.config_file.validate(file)
+                if len(problems) > 20:
+                    problems = problems[:20] + [f"... {len(problems) - 20} more"]
+                if problems:
+                    mb.showwarning(
+                        title="Site plan problems", message="\n".join(problems)
+                    )
+
+        if self.file == "":
+            return
+        self.show_rows(self.read_config(self.file))
+
+    def show_rows(self, csvlist: list) -> None:
+        """
+        Update the Treeview to show csvlist.
 
-        for entry in self.tree.get_children():
-            self.tree.delete(entry)
-        csvlist = self.read_config(self.file)
+        Only rows that left the view are deleted and only changed rows
+        are updated. New rows are inserted in chunks from idle callbacks,
+        so large plans do not block the main loop.
+        """
+        if self.fill_job is not None:
+            self.after_cancel(self.fill_job)
+            self.fill_job = None
+        wanted = []  # type: list[tuple[str, tuple]]
+        seen = {}  # type: dict[tuple, int]
         for entry in csvlist:
-            self.tree.insert("", tk.END, values=list(entry))
+            # Item id from Cabinet and AP, numbered if the plan repeats them
+            count = seen.get(entry[:2], 0)
+            seen[entry[:2]] = count + 1
+            wanted.append((f"{entry[0]}\x1f{entry[1]}\x1f{count}", entry))
+        wanted_ids = {iid for iid, _ in wanted}
+        gone = [iid for iid in self.tree.get_children() if iid not in wanted_ids]
+        if gone:
+            self.tree.delete(*gone)
+        self.shown = {iid: self.shown[iid] for iid in self.shown if iid in wanted_ids}
+        new = []
+        for index, (iid, entry) in enumerate(wanted):
+            if iid not in self.shown:
+                new.append((index, iid, entry))
+            elif self.shown[iid] != entry:
+                self.tree.item(iid, values=list(entry))
+                self.shown[iid] = entry
+        self.fill(new, 0)
         # Statusline
-        total_count = len(self.tree.get_children())
-        label = ttk.Label(self.frame2, text=f"Total objects: {total_count}")
-        label.grid(row=0, column=0)
+        self.status.config(text=f"Total objects: {len(wanted)}")
+
+    def fill(self, new: list, start: int) -> None:
+        """Insert a chunk of new rows and schedule the next one."""
+        stop = start + TREE_CHUNK
+        for index, iid, entry in new[start:stop]:
+            self.tree.insert("", index, iid=iid, values=list(entry))
+            self.shown[iid] = entry
+        if stop < len(new):
+            self.fill_job = self.after_idle(self.fill, new, stop)
+        else:
+            self.fill_job = None
 
     def read_config(self, file: str) -> list:
         """
@@ -496,74 +659,57 @@ class AutoConf(tk.Frame):
         Outputs:
             parsed list (list)
         """
-        config = []
-        csvconfig = self.config_file.read_config(file)
-        for row in csvconfig:
-            if row["SW"] == "1":
-                # Not configured
-                if self.swconf.get() == 0:
-                    # Only Main
-                    if self.swmainred.get() == 0:
-                        config.append(
-                            (
-                                row["Cabinet"],
-                                row["AP"],
-                                row["Switch IP address"],
-                                row["Position"],
-                            )
-                        )
-                    # Only Reserve
-                    else:
-                        if row["DIPB"] != "":
-                            config.append(
-                                (
-                                    row["Cabinet"],
-                                    row["AP"],
-                                    row["Switch IP address"],
-                                    row["Position"],
-                                )
-                            )
-                # Configured
-                else:
-                    # Only Main
-                    if self.swmainred.get() == 0:
-                        if row["DIPB"] != "" and row["MAC M"] == "":
-                            config.append(
-                                (
-                                    row["Cabinet"],
-                                    row["AP"],
-                                    row["Switch IP address"],
-                                    row["Position"],
-                                )
-                            )
-                    # Only Reserve
-                    else:
-                        if row["DIPR"] != "" and row["MAC R"] == "":
-                            config.append(
-                                (
-                                    row["Cabinet"],
-                                    row["AP"],
-                                    row["Switch IP address"],
-                                    row["Position"],
-                                )
-                            )
-        return config
+        rows = self.config_file.select(
+            file, main=self.swmainred.get() == 0, unconfigured=self.swconf.get() == 1
+        )
+        return [
+            (row["Cabinet"], row["AP"], row["Switch IP address"], row["Position"])
+            for row in rows
+        ]
 
 
 class LogView(tk.Frame):
     """Logviewer GUI for moxa configurator."""
 
+    needs_login = True
+
     def __init__(self, parent, controller) -> None:
         """Initialize the class."""
         tk.Frame.__init__(self, parent)
-        self.rowconfigure(0, weight=1)
+        self.worker = controller.worker
+        self.rowconfigure(1, weight=1)
         self.columnconfigure(0, weight=1)
+        # Parsed entries, the widget only shows the filtered tail of these
+        self.entries = []  # type: list[list]
+        self.follow_job = None  # type: str | None
+        self.follow = tk.IntVar(value=0)
+        self.severity = tk.StringVar(value="all")
+        self.search = tk.StringVar(value="")
         # Frame 0 BUTTONS:
         self.frame0 = tk.Frame(self)
         self.frame0.grid(row=0, column=0, sticky="n")
         self.clr_button = tk.Button(
             self.frame0, text="Clear Log", width=10, command=lambda: self.clearlog()
         )
+        self.follow_button = tk.Checkbutton(
+            self.frame0,
+            text="Follow",
+            variable=self.follow,
+            indicatoron=False,
+            width=8,
+            command=self.toggle_follow,
+        )
+        self.severity_menu = tk.OptionMenu(
+            self.frame0,
+            self.severity,
+            "all",
+            "info",
+            "warning",
+            "critical",
+            command=lambda _: self.redraw(),
+        )
+        self.search_entry = tk.Entry(self.frame0, textvariable=self.search, width=20)
+        self.search_entry.bind("<KeyRelease>", lambda _: self.redraw())
         self.return_button = tk.Button(
             self.frame0,
             text="Return",
@@ -574,33 +720,102 @@ class LogView(tk.Frame):
         self.frame1 = tk.Frame(self)
         self.frame1.grid(row=1, column=0, sticky="nsew")
         self.scrollbar = ttk.Scrollbar(self.frame1, orient=tk.VERTICAL)
-        self.logtext = tk.Text(self.frame1)
+        self.logtext = tk.Text(self.frame1, yscrollcommand=self.scrollbar.set)
+        self.scrollbar.config(command=self.logtext.yview)
 
     def clearlog(self) -> None:
         """Clear the Eventlog."""
-        self.config(cursor="watch")
-        moxa_switch.clear_eventlog()
+        self.worker.submit(lambda conn: conn.clear_eventlog())
         self.refresh()
 
     def refresh(self) -> None:
         """Refresh the values in the frame."""
         self.clr_button.pack(side="left")
+        self.follow_button.pack(side="left")
+        self.severity_menu.pack(side="left")
+        self.search_entry.pack(side="left")
         self.return_button.pack(side="left")
-        self.config(cursor="watch")
+        self.worker.submit(lambda conn: conn.get_eventlog(), callback=self.show_log)
+
+    def toggle_follow(self) -> None:
+        """Start or stop reading the log on a timer."""
+        if self.follow_job is not None:
+            self.after_cancel(self.follow_job)
+            self.follow_job = None
+        if self.follow.get():
+            self.follow_tick()
+
+    def follow_tick(self) -> None:
+        """Read the log again while following and the frame is shown."""
+        if self.winfo_ismapped():
+            self.worker.submit(
+                lambda conn: conn.get_eventlog(), callback=self.show_log, quiet=True
+            )
+        self.follow_job = self.after(LOG_FOLLOW_MS, self.follow_tick)
+
+    def matches(self, entry: list) -> bool:
+        """Return True if entry passes the severity and text filters."""
+        severity = self.severity.get()
+        if severity != "all" and event_severity(entry[5]) != severity:
+            return False
+        return self.search.get().lower() in entry[5].lower()
+
+    @staticmethod
+    def format_entry(entry: list) -> str:
+        """Format an entry as one line of text."""
+        return (
+            f"{entry[0]:<6} {entry[1]:<6} {entry[2]:<10} {entry[3]:<8} "
+            f"{entry[4]:<12} {entry[5]}\n"
+        )
+
+    def show_lines(self, entries: list, replace: bool) -> None:
+        """Append (or replace with) entries and trim to LOG_MAX_LINES."""
         self.logtext.config(state=tk.NORMAL)
-        self.logtext.delete(1.0, tk.END)
-        self.logtext.insert(tk.END, moxa_switch.get_eventlog())
-        self.logtext.grid()
+        if replace:
+            self.logtext.delete(1.0, tk.END)
+        self.logtext.insert(
+            tk.END, "".join(self.format_entry(entry) for entry in entries)
+        )
+        lines = int(self.logtext.index("end-1c").split(".")[0]) - 1
+        if lines > LOG_MAX_LINES:
+            self.logtext.delete(1.0, f"{lines - LOG_MAX_LINES + 1}.0")
+        self.logtext.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
         self.logtext.config(state=tk.DISABLED)
-        self.config(cursor="")
+        if self.follow.get():
+            self.logtext.see(tk.END)
+
+    def redraw(self) -> None:
+        """Show the tail of the entries passing the filters."""
+        shown = [entry for entry in self.entries if self.matches(entry)]
+        self.show_lines(shown[-LOG_MAX_LINES:], replace=True)
+
+    def show_log(self, eventlog: str) -> None:
+        """Show the entries read by the worker that are not shown yet."""
+        entries = parse_eventlog(eventlog)
+        last = self.entries[-1][0] if self.entries else 0
+        if not entries or entries[-1][0] < last:
+            # Log was cleared on the switch
+            self.entries = entries
+            self.redraw()
+            return
+        new = [entry for entry in entries if entry[0] > last]
+        self.entries.extend(new)
+        self.show_lines([entry for entry in new if self.matches(entry)], False)
 
 
 class Firmware(tk.Frame):
     """Firmware GUI for moxa configurator."""
 
+    needs_login = False
+
     def __init__(self, parent, controller) -> None:
         """Initialize the class."""
         tk.Frame.__init__(self, parent)
+        self.controller = controller
+        self.worker = controller.worker
+        self.filesize = 0
+        self.transferring = False
         self.rowconfigure(1, weight=1)
         self.columnconfigure(0, weight=1)
         self.frame0 = tk.Frame(self)
@@ -632,38 +847,61 @@ class Firmware(tk.Frame):
         self.frame2.grid(row=2, column=0, sticky="s")
         self.value_label.grid(column=0, row=1, columnspan=2)
 
-    @threaded
     def get_file(self) -> None:
         """Transfer Firmware with XMODEM."""
         filename = fd.askopenfilename(
             initialdir="./site/", filetypes=[("Rom files", ".rom")]
         )
-        if filename != ():
-            blocks = 128
-            filesize = os.path.getsize(filename)
-
-            def copy():
-                """Do the command for firmware copy."""
-                return moxa_switch.copy_firmware(filename)
-
-            def transfer():
-                """Start the transfer thread."""
-                thread = Thread(target=copy)
-                thread.start()
-                return thread
-
-            transfer_func = transfer()
-            while transfer_func.is_alive():
-                self.value_label.config(text=self.update_progress_label())
-                self.progressbar.config(
-                    value=round(100 * blocks * moxa_switch.success_count / filesize)
-                )
-
-            if transfer_func:
-                mb.showinfo(title="Success", message="Success, switch is rebooting")
-                sys.exit(0)
-            else:
-                mb.showerror(title="Error", message="Something went wrong")
+        if filename:
+            self.filesize = os.path.getsize(filename)
+            self.transferring = True
+            self.worker.submit(
+                self.copy_firmware,
+                filename,
+                callback=self.transferred,
+                errback=self.failed,
+            )
+            self.progress()
+
+    @staticmethod
+    def copy_firmware(conn, filename: str) -> bool:
+        """Send the firmware and journal the transfer (worker thread)."""
+        start = perf_counter()
+        with held(conn):
+            status = conn.copy_firmware(filename)
+        os.makedirs(os.path.dirname(FIRMWARE_JOURNAL), exist_ok=True)
+        JobJournal(FIRMWARE_JOURNAL).record(
+            os.path.basename(filename),
+            "firmware",
+            status,
+            port=DEVICE,
+            seconds=round(perf_counter() - start, 3),
+        )
+        return status
+
+    def progress(self) -> None:
+        """Update the progressbar while the worker transfers."""
+        if not self.transferring:
+            return
+        blocks = 128
+        sent = getattr(self.worker.connection, "success_count", 0)
+        self.progressbar.config(value=round(100 * blocks * sent / self.filesize))
+        self.value_label.config(text=self.update_progress_label())
+        self.after(200, self.progress)
+
+    def transferred(self, status: bool) -> None:
+        """Show the result of the transfer."""
+        self.transferring = False
+        if status:
+            mb.showinfo(title="Success", message="Success, switch is rebooting")
+            self.controller.close()
+        else:
+            mb.showerror(title="Error", message="Something went wrong")
+
+    def failed(self, error: Exception) -> None:
+        """Stop the progressbar and show why the transfer failed."""
+        self.transferring = False
+        mb.showerror(title="Error", message=f"Transfer failed: {error}")
 
 
 if __name__ == "__main__":
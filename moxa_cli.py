@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Command line provisioning for Moxa EDS switches, without the GUI."""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+from time import perf_counter, sleep, time
+
+from moxa_conf_lib import duplicate_names, hostname, render_rows, write_configs
+from moxa_csv_lib import ConfigFile
+from moxa_event_lib import EventStore, collect
+from moxa_journal_lib import FINISHED, SUFFIX, JobJournal, target
+from moxa_mux_lib import SOCKET, MuxServer, held, open_connection
+from moxa_report_lib import load, summarize, write_csv, write_html
+from moxa_prov_lib import (
+    NO_ANSWER,
+    alarm_ports,
+    login,
+    provision,
+    push_config,
+    reconcile,
+)
+from moxa_sql_lib import SqlConfigFile
+from moxa_watch_lib import DeviceWatcher
+
+RETRY_S = 2.0  # Wait between login tries while waiting for a switch
+WAIT_TRIES = 30  # Login tries before giving up, unless --continuous
+WATCH_S = 1.0  # Wait between scans for plugged in adapters
+
+
+def open_plan(file: str):
+    """Return the site plan backend for file, by extension."""
+    if file.endswith(".db"):
+        return SqlConfigFile()
+    return ConfigFile()
+
+
+def select_rows(config_file, file: str, args: argparse.Namespace) -> list:
+    """
+    Select the rows to provision, like the AutoConf buttons.
+
+    Returns:
+        rows (list)
+    """
+    rows = config_file.select(file, main=not args.reserve, unconfigured=not args.all)
+    if args.cabinet:
+        rows = [row for row in rows if row["Cabinet"] in args.cabinet]
+    return rows
+
+
+class Station:
+    """Provision rows from a shared queue on one serial port."""
+
+    def __init__(self, port: str, args: argparse.Namespace, shared: dict) -> None:
+        """Initialize the class."""
+        self.port = port
+        self.args = args
+        self.shared = shared
+        self.done = set()  # type: set[str]
+        self.conn = None
+        self.stopped = threading.Event()
+
+    def emit(self, record: dict) -> None:
+        """Print one result as a JSON line."""
+        with self.shared["lock"]:
+            print(json.dumps(record), flush=True)
+        self.shared["results"].append(record)
+
+    def stop(self) -> None:
+        """Stop after the current row, the adapter was unplugged."""
+        self.stopped.set()
+
+    def gone(self) -> bool:
+        """Return True when the adapter is no longer there."""
+        return self.stopped.is_set() or not os.path.exists(self.port)
+
+    def wait_for_switch(self) -> str:
+        """
+        Log in and return the MAC of a switch not provisioned here yet.
+
+        Without --continuous only WAIT_TRIES logins are tried.
+
+        Raises:
+            RuntimeError: when unplugged or no new switch answered
+        """
+        tries = 0
+        while True:
+            if self.stopped.is_set():
+                raise RuntimeError(f"{self.port} was unplugged")
+            if login(self.conn) != NO_ANSWER:
+                mac = self.conn.get_sysinfo()[4]
+                if mac not in self.done:
+                    return mac
+            tries += 1
+            if not self.args.continuous and tries >= WAIT_TRIES:
+                raise RuntimeError(f"no new switch answered on {self.port}")
+            sleep(RETRY_S)
+
+    def resume_row(self, mac: str, key: str) -> tuple | None:
+        """
+        Return the other selected row this switch is half done for.
+
+        That row is claimed for this station, so it is passed over when
+        it comes out of the queue, and the row given up (key) is free
+        for the next station again.
+
+        Returns:
+            (key, row), None when it is not half done for another row
+        """
+        claimed = self.shared["claimed"]
+        with self.shared["lock"]:
+            started = self.shared["journal"].started(mac)
+            if started is None or started == key or started in claimed:
+                return None
+            if started not in self.shared["by_target"]:
+                return None
+            claimed.add(started)
+            claimed.discard(key)
+        return started, self.shared["by_target"][started]
+
+    def run_row(self, row: dict) -> dict:
+        """Provision one row and return its result record."""
+        main = not self.args.reserve
+        record = {
+            "port": self.port,
+            "cabinet": row["Cabinet"],
+            "ap": row["AP"],
+            "hostname": hostname(row["Cabinet"], main),
+            "ip": row["Switch IP address"],
+            "mac": None,
+            "ok": False,
+            "error": None,
+            "steps": {},
+        }
+        journal = self.shared["journal"]
+        key = target(row["Cabinet"], row["AP"], main)
+
+        def note(step: str, ok: bool = True, **fields) -> None:
+            """Journal a step of this row."""
+            journal.record(key, step, ok, port=self.port, **fields)
+
+        start = perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = open_connection(self.port)
+            with held(self.conn):
+                step = perf_counter()
+                mac = self.wait_for_switch()
+                resumed = self.resume_row(mac, key)
+                if resumed is not None:
+                    # This switch is half done for another row, finish that one
+                    self.shared["rows"].put(row)
+                    key, row = resumed
+                    record.update(
+                        cabinet=row["Cabinet"],
+                        ap=row["AP"],
+                        hostname=hostname(row["Cabinet"], main),
+                        ip=row["Switch IP address"],
+                    )
+                record["steps"]["login"] = round(perf_counter() - step, 3)
+                note("login", mac=mac, seconds=record["steps"]["login"])
+                config_file = self.shared["config_file"]
+                file = self.args.plan
+                with self.shared["lock"]:
+                    known = config_file.find_mac(file, mac)
+                if known:
+                    raise RuntimeError(
+                        f"MAC {mac} already recorded for {known[0]['Cabinet']}"
+                    )
+                profile = self.conn.detect_profile()
+                ports = alarm_ports(self.conn.get_ifaces(), profile["ports"])
+                options = {"log": lambda name, seconds: note(name, seconds=seconds)}
+                options["names"] = profile["names"]
+                if self.args.full and not self.args.xmodem:
+                    apply = provision
+                    # Resume a half done switch after the last finished step
+                    options["done"] = journal.completed(key, mac)
+                else:
+                    apply = reconcile
+                if self.args.xmodem:
+                    apply = push_config
+                    options["abort"] = self.gone
+                mac = apply(
+                    self.conn,
+                    record["hostname"],
+                    row["Position"],
+                    row["Switch IP address"],
+                    ports,
+                    record["steps"],
+                    **options,
+                )
+                step = perf_counter()
+                with self.shared["lock"]:
+                    config_file.write_config(file, row["Cabinet"], row["AP"], mac, main)
+                record["steps"][FINISHED] = round(perf_counter() - step, 3)
+                note(FINISHED, mac=mac, seconds=record["steps"][FINISHED])
+                record["mac"] = mac
+                record["ok"] = True
+                self.done.add(mac)
+        except Exception as error:  # noqa: B902 - reported per switch
+            record["error"] = f"{type(error).__name__}: {error}"
+            note("failed", ok=False, error=record["error"])
+        record["seconds"] = round(perf_counter() - start, 3)
+        return record
+
+    def claim(self, row: dict) -> bool:
+        """Take a row from the queue, False when it is done or taken."""
+        key = target(row["Cabinet"], row["AP"], not self.args.reserve)
+        with self.shared["lock"]:
+            if key in self.shared["claimed"] or self.shared["journal"].finished(key):
+                return False
+            self.shared["claimed"].add(key)
+            return True
+
+    def unclaim(self, record: dict) -> None:
+        """Put the row of a record back in the queue for another station."""
+        key = target(record["cabinet"], record["ap"], not self.args.reserve)
+        with self.shared["lock"]:
+            self.shared["claimed"].discard(key)
+        self.shared["rows"].put(self.shared["by_target"][key])
+
+    def run(self) -> None:
+        """Work through the queue, one switch at a time."""
+        try:
+            while not self.stopped.is_set():
+                try:
+                    row = self.shared["rows"].get_nowait()
+                except queue.Empty:
+                    return
+                if not self.claim(row):
+                    # Finished or resumed by another station, not a turn
+                    continue
+                record = self.run_row(row)
+                if self.args.watch and not record["ok"] and self.gone():
+                    # Unplugged mid row, leave it for another station
+                    self.unclaim(record)
+                    return
+                self.emit(record)
+                if not self.args.continuous:
+                    return
+        finally:
+            if self.conn is not None:
+                try:
+                    self.conn.close()
+                except OSError:
+                    pass
+
+
+def watch(args: argparse.Namespace, shared: dict) -> None:
+    """
+    Run a station on every serial adapter that is plugged in.
+
+    Stations are started as adapters appear, and stopped and joined as
+    they go, until the queue is empty and every station has finished.
+    Without --continuous each station does one row, so the run also
+    ends once they all have. Ports given with --port have their own
+    station.
+    """
+    watcher = DeviceWatcher()
+    stations = {}  # type: dict[str, tuple[Station, threading.Thread]]
+    fixed = set(args.port or [])
+    while True:
+        added, removed = watcher.scan()
+        for port in removed:
+            if port in stations:
+                # Wait for it to let go of the port before it is forgotten
+                station, thread = stations.pop(port)
+                station.stop()
+                thread.join()
+        for port in added:
+            if port in fixed:
+                continue
+            station = Station(port, args, shared)
+            thread = threading.Thread(target=station.run, daemon=True)
+            thread.start()
+            stations[port] = (station, thread)
+        busy = [port for port, (_, thread) in stations.items() if thread.is_alive()]
+        if shared["rows"].empty() and not busy:
+            return
+        if stations and not busy and not args.continuous:
+            return
+        sleep(WATCH_S)
+
+
+def cmd_provision(args: argparse.Namespace) -> int:
+    """Provision the selected rows of a site plan on one or more ports."""
+    if not args.port and not args.watch:
+        print("Give a serial port with --port, or --watch", file=sys.stderr)
+        return 2
+    config_file = open_plan(args.plan)
+    problems = config_file.validate(args.plan)
+    if problems and not args.force:
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        print("Site plan has problems, use --force to go on", file=sys.stderr)
+        return 2
+    journal = JobJournal(args.journal or args.plan + SUFFIX)
+    rows = queue.Queue()  # type: queue.Queue
+    by_target = {}
+    for row in select_rows(config_file, args.plan, args):
+        key = target(row["Cabinet"], row["AP"], not args.reserve)
+        if journal.finished(key):
+            # Done in an earlier run, only unfinished rows take a turn
+            continue
+        rows.put(row)
+        by_target[key] = row
+    shared = {
+        "config_file": config_file,
+        "rows": rows,
+        "by_target": by_target,
+        "claimed": set(),
+        "lock": threading.Lock(),
+        "results": [],
+        "journal": journal,
+    }
+    threads = []
+    for port in args.port or []:
+        station = Station(port, args, shared)
+        thread = threading.Thread(target=station.run, daemon=True)
+        thread.start()
+        threads.append(thread)
+    if args.watch:
+        watch(args, shared)
+    for thread in threads:
+        thread.join()
+    config_file.flush()
+    return 0 if all(record["ok"] for record in shared["results"]) else 1
+
+
+def cmd_render(args: argparse.Namespace) -> int:
+    """Render the config file of every selected row of a site plan."""
+    config_file = open_plan(args.plan)
+    rows = select_rows(config_file, args.plan, args)
+    template = {}
+    if args.template:
+        with open(args.template, "r") as f:
+            template["template"] = f.read()
+    rendered = render_rows(rows, not args.reserve, workers=args.jobs, **template)
+    clashes = duplicate_names(rendered)
+    if clashes:
+        for name in clashes:
+            print(f"{name}: more than one row renders this file", file=sys.stderr)
+        return 1
+    written = write_configs(rendered, args.output)
+    print(f"{len(rendered)} configs, {written} written to {args.output}")
+    return 0
+
+
+def on_ports(ports: list, job) -> int:
+    """
+    Log in on every port in parallel and run job(conn) there.
+
+    Args:
+        ports (list): serial ports
+        job (callable): returns the line to print, raises on failure
+    Returns:
+        int: 0 when every port succeeded, else 1
+    """
+    failed = []
+
+    def run(port: str) -> None:
+        """Run the job on one port."""
+        conn = None
+        try:
+            conn = open_connection(port)
+            if login(conn) < 0:
+                raise RuntimeError("no switch answered")
+            print(f"{port}: {job(conn)}", flush=True)
+        except Exception as error:  # noqa: B902 - reported per port
+            print(f"{port}: {type(error).__name__}: {error}", file=sys.stderr)
+            failed.append(port)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    threads = [threading.Thread(target=run, args=(port,)) for port in ports]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return 1 if failed else 0
+
+
+def cmd_collect(args: argparse.Namespace) -> int:
+    """Read the event logs of the switches on the given ports into a store."""
+    store = EventStore(args.store)
+    return on_ports(
+        args.port, lambda conn: f"{collect(conn, store, args.site)} new entries"
+    )
+
+
+def cmd_clock(args: argparse.Namespace) -> int:
+    """Set the clock of the switches on the given ports."""
+
+    def sync(conn) -> str:
+        """Set the clock, once more when the skew is too large."""
+        for _ in range(2):
+            skew = conn.set_clock()
+            if skew is not None and abs(skew) <= args.max_skew:
+                return f"skew {skew:+.3f} s"
+        raise RuntimeError(f"skew {skew} s, more than {args.max_skew} s")
+
+    return on_ports(args.port, sync)
+
+
+def cmd_backup(args: argparse.Namespace) -> int:
+    """Download the startup config of the switches on the given ports."""
+    os.makedirs(args.output, exist_ok=True)
+
+    def backup(conn) -> str:
+        """Stream the config to <hostname>.ini."""
+        file = os.path.join(args.output, conn.get_sysinfo()[0] + ".ini")
+        with open(file, "wb") as sink:
+            return f"{conn.stream_config(sink)} bytes to {file}"
+
+    return on_ports(args.port, backup)
+
+
+def cmd_mux(args: argparse.Namespace) -> int:
+    """Serve the switch consoles to other processes until interrupted."""
+    server = MuxServer(args.socket, args.keepalive)
+    print(f"Serving consoles on {args.socket}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    """Create a site plan database from a site plan CSV."""
+    count = SqlConfigFile().import_csv(args.csv, args.db)
+    print(f"{count} rows imported to {args.db}")
+    return 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """Write a site plan database back to a site plan CSV."""
+    SqlConfigFile().export_csv(args.db, args.csv)
+    print(f"{args.db} exported to {args.csv}")
+    return 0
+
+
+def cmd_report(args: argparse.Namespace) -> int:
+    """Write a throughput report from job journals."""
+    summary = summarize(load(args.journal))
+    if args.output.endswith(".csv"):
+        write_csv(summary, args.output)
+    else:
+        write_html(summary, args.output)
+    total = summary["total"]
+    print(f"{total['configured']} of {total['runs']} runs configured a switch")
+    return 0
+
+
+def cmd_events(args: argparse.Namespace) -> int:
+    """Print stored event log entries as JSON lines."""
+    entries = EventStore(args.store).query(
+        since=None if args.last is None else time() - args.last,
+        mac=args.mac,
+        site=args.site,
+        severity=args.severity,
+        text=args.grep,
+    )
+    for entry in entries:
+        print(json.dumps(entry))
+    return 0
+
+
+def parser() -> argparse.ArgumentParser:
+    """Build the argument parser."""
+    root = argparse.ArgumentParser(description=__doc__)
+    commands = root.add_subparsers(dest="command", required=True)
+    prov = commands.add_parser("provision", help="configure switches from a plan")
+    prov.add_argument("plan", help="site plan, .csv or .db")
+    prov.add_argument(
+        "-p",
+        "--port",
+        action="append",
+        help="serial port with a switch attached, repeat for more stations",
+    )
+    prov.add_argument(
+        "--watch",
+        action="store_true",
+        help="run a station on every USB serial adapter plugged in",
+    )
+    prov.add_argument(
+        "--reserve", action="store_true", help="reserve switches instead of main"
+    )
+    prov.add_argument(
+        "--all", action="store_true", help="include rows with a MAC recorded"
+    )
+    prov.add_argument(
+        "--cabinet", action="append", help="only this cabinet, may be repeated"
+    )
+    prov.add_argument(
+        "--continuous",
+        action="store_true",
+        help="keep going, waiting for the next switch on each port",
+    )
+    prov.add_argument(
+        "--force", action="store_true", help="provision despite plan problems"
+    )
+    prov.add_argument(
+        "--full",
+        action="store_true",
+        help="send every setting instead of only what differs",
+    )
+    prov.add_argument(
+        "--xmodem",
+        action="store_true",
+        help="upload a complete config file in one transfer",
+    )
+    prov.add_argument(
+        "--journal", help="job journal to resume from, default <plan>.jobs"
+    )
+    prov.set_defaults(func=cmd_provision)
+    render = commands.add_parser("render", help="write config files for a plan")
+    render.add_argument("plan", help="site plan, .csv or .db")
+    render.add_argument("-o", "--output", required=True, help="output directory")
+    render.add_argument(
+        "--reserve", action="store_true", help="reserve switches instead of main"
+    )
+    render.add_argument(
+        "--cabinet", action="append", help="only this cabinet, may be repeated"
+    )
+    render.add_argument("--template", help="switch template file, str.format fields")
+    render.add_argument("-j", "--jobs", type=int, help="processes, one per core")
+    render.set_defaults(func=cmd_render, all=True)
+    coll = commands.add_parser("collect", help="store switch event logs")
+    coll.add_argument("store", help="event store, SQLite database")
+    coll.add_argument(
+        "-p", "--port", action="append", required=True, help="serial port"
+    )
+    coll.add_argument("--site", default="", help="site name stored with entries")
+    coll.set_defaults(func=cmd_collect)
+    clock = commands.add_parser("clock", help="set switch clocks to this host")
+    clock.add_argument(
+        "-p", "--port", action="append", required=True, help="serial port"
+    )
+    clock.add_argument(
+        "--max-skew", type=float, default=0.1, help="seconds allowed, default 0.1"
+    )
+    clock.set_defaults(func=cmd_clock)
+    backup = commands.add_parser("backup", help="download switch configs")
+    backup.add_argument("-o", "--output", required=True, help="output directory")
+    backup.add_argument(
+        "-p", "--port", action="append", required=True, help="serial port"
+    )
+    backup.set_defaults(func=cmd_backup)
+    mux = commands.add_parser("mux", help="share serial consoles between tools")
+    mux.add_argument("--socket", default=SOCKET, help=f"default {SOCKET}")
+    mux.add_argument(
+        "--keepalive", type=float, default=60.0, help="idle seconds between checks"
+    )
+    mux.set_defaults(func=cmd_mux)
+    imp = commands.add_parser("import", help="create a site plan database")
+    imp.add_argument("csv", help="site plan CSV")
+    imp.add_argument("db", help="database to (re)create, .db")
+    imp.set_defaults(func=cmd_import)
+    exp = commands.add_parser("export", help="write a site plan database as CSV")
+    exp.add_argument("db", help="site plan database, .db")
+    exp.add_argument("csv", help="site plan CSV to write")
+    exp.set_defaults(func=cmd_export)
+    report = commands.add_parser("report", help="throughput from job journals")
+    report.add_argument("journal", nargs="+", help="job journals, <plan>.jobs")
+    report.add_argument(
+        "-o", "--output", required=True, help="report file, .html or .csv"
+    )
+    report.set_defaults(func=cmd_report)
+    events = commands.add_parser("events", help="query the event store")
+    events.add_argument("store", help="event store, SQLite database")
+    events.add_argument("--last", type=float, help="only the last (seconds)")
+    events.add_argument("--mac", help="only this switch")
+    events.add_argument("--site", help="only this site")
+    events.add_argument("--severity", choices=("critical", "warning", "info"))
+    events.add_argument("--grep", help="only events containing this text")
+    events.set_defaults(func=cmd_events)
+    return root
+
+
+def main(argv=None) -> int:
+    """Run the command line."""
+    args = parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
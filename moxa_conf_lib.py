@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module to build complete switch config files for an XMODEM import."""
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from string import Formatter
+
+from moxa_model_lib import profile_for
+
+IFACE = re.compile(r"interface ethernet (\d+/(\d+))$")
+PARALLEL_ROWS = 500  # Plans with more rows are rendered on a process pool
+ALARM_COLUMN = "Alarm ports"  # Optional plan column, port numbers like "1 3"
+MODEL_COLUMN = "Model"  # Optional plan column, like "EDS-516A"
+MANIFEST = "hashes.json"  # Content hash per rendered file, in the output dir
+NETMASK = "255.255.255.0"  # Management netmask, as set by conf_ip
+
+# Quoted, so values with spaces read back as parse_running_config expects
+HOSTNAME = 'hostname "{hostname}"'
+LOCATION = 'snmp-server location "{location}"'
+# {hostname}, {location}, {ip}, {netmask} and {ports}, the rendered
+# PORT_TEMPLATE of every port
+TEMPLATE = "\n".join(
+    (
+        HOSTNAME,
+        LOCATION,
+        "interface mgmt",
+        " ip address static {ip} {netmask}",
+        "!",
+        "{ports}",
+    )
+)
+# {port} number, {name} interface name and {alarm} relay-warning line
+PORT_TEMPLATE = "interface ethernet {name}\n {alarm}\n!\n"
+
+
+def hostname(cabinet: str, main: bool) -> str:
+    """Return the hostname of the Main or Reserve switch of a cabinet."""
+    return cabinet + ("M" if main else "R")
+
+
+def _sections(config: str) -> list:
+    """
+    Split a config into top level sections.
+
+    Returns:
+        list: [header line, [indented lines]] per section, the header of
+              top level settings is the line itself with no body
+    """
+    sections = []  # type: list
+    for line in config.splitlines():
+        if line.startswith(" ") and sections:
+            sections[-1][1].append(line)
+        elif line != "!":
+            sections.append([line, []])
+    return sections
+
+
+def apply_state(config: str, desired: dict) -> str:
+    """
+    Patch the provisioned settings into a full switch config.
+
+    Everything provisioning does not own is kept as it is in (config),
+    so the result can be imported in one transfer instead of being
+    typed line by line.
+
+    Args:
+        config (str): current config, as returned by get_running_config
+        desired (dict): as returned by moxa_prov_lib.desired_state
+    Returns:
+        str: config file text
+    """
+    hostname = HOSTNAME.format(hostname=desired["hostname"])
+    location = LOCATION.format(location=desired["location"])
+    address = f" ip address static {desired['ip']} {desired['netmask']}"
+    seen = set()
+    sections = _sections(config)
+    for section in sections:
+        header, body = section
+        if header.startswith("hostname "):
+            section[0] = hostname
+            seen.add("hostname")
+        elif header.startswith("snmp-server location "):
+            section[0] = location
+            seen.add("location")
+        elif header == "interface mgmt":
+            body[:] = [line for line in body if "ip address" not in line]
+            body.insert(0, address)
+            seen.add("mgmt")
+        elif IFACE.match(header):
+            name, number = IFACE.match(header).groups()
+            if name in desired["names"]:
+                count = desired["names"].index(name)
+            else:
+                count = int(number) - 1
+            body[:] = [line for line in body if "relay-warning event link" not in line]
+            if count < desired["ports"]:
+                if desired["alarms"].get(count, 0):
+                    body.append(" relay-warning event link-off")
+                else:
+                    body.append(" no relay-warning event link")
+            seen.add(count)
+    if "location" not in seen:
+        sections.insert(0, [location, []])
+    if "hostname" not in seen:
+        sections.insert(0, [hostname, []])
+    if "mgmt" not in seen:
+        sections.append(["interface mgmt", [address]])
+    for count in range(desired["ports"]):
+        if count not in seen and desired["alarms"].get(count, 0):
+            header = "interface ethernet " + desired["names"][count]
+            sections.append([header, [" relay-warning event link-off"]])
+    lines = []
+    for header, body in sections:
+        lines.append(header)
+        if body or header.startswith("interface "):
+            lines += body + ["!"]
+    return "\n".join(lines) + "\n"
+
+
+class Template:
+    """
+    A config template compiled once and rendered for many switches.
+
+    The text uses str.format fields, with conversions and format specs
+    like {port:>2} or {location!r}. It is split into literal text and
+    fields when created, so rendering a row is one join.
+
+    Raises:
+        ValueError: for a malformed template or a nested format spec
+    """
+
+    def __init__(self, text: str) -> None:
+        """Initialize the class."""
+        self.formatter = Formatter()
+        self.parts = []  # type: list[tuple[str, str | None, str, str | None]]
+        for literal, field, spec, conversion in self.formatter.parse(text):
+            if spec and "{" in spec:
+                raise ValueError(f"nested format spec in {{{field}:{spec}}}")
+            self.parts.append((literal, field, spec or "", conversion))
+
+    def field(self, values: dict, field: str, spec: str, conversion) -> str:
+        """Return one field converted and formatted."""
+        value = values[field]
+        if conversion is not None:
+            value = self.formatter.convert_field(value, conversion)
+        return format(value, spec)
+
+    def render(self, values: dict) -> str:
+        """
+        Fill in the template.
+
+        Raises:
+            KeyError: when a field has no value
+        """
+        return "".join(
+            literal
+            + ("" if field is None else self.field(values, field, spec, conversion))
+            for literal, field, spec, conversion in self.parts
+        )
+
+
+def row_values(row: dict, main: bool) -> dict:
+    """
+    Return the template values for a site plan row.
+
+    The port count and names come from the profile of the row's model,
+    the default model when the plan has no model column.
+
+    Args:
+        row (dict): site plan row
+        main (bool): Main or Reserve switch
+    Returns:
+        dict: hostname, location, ip, netmask, alarms (list of 0/1) and
+              names (interface name per port)
+    """
+    profile = profile_for(row.get(MODEL_COLUMN) or "")
+    ports = profile["ports"]
+    alarms = [0] * ports
+    for port in row.get(ALARM_COLUMN, "").replace(",", " ").split():
+        if port.isdigit() and 0 < int(port) <= ports:
+            alarms[int(port) - 1] = 1
+    return {
+        "hostname": hostname(row["Cabinet"], main),
+        "location": row["Position"],
+        "ip": row["Switch IP address"],
+        "netmask": NETMASK,
+        "alarms": alarms,
+        "names": profile["names"],
+    }
+
+
+def render_row(
+    template: Template, port_template: Template, row: dict, main: bool
+) -> tuple:
+    """
+    Render the config of one site plan row.
+
+    Returns:
+        tuple: (hostname, config text)
+    """
+    values = row_values(row, main)
+    values["ports"] = "".join(
+        port_template.render(
+            {
+                "port": count + 1,
+                "name": values["names"][count],
+                "alarm": (
+                    "relay-warning event link-off"
+                    if alarm
+                    else "no relay-warning event link"
+                ),
+            }
+        )
+        for count, alarm in enumerate(values["alarms"])
+    )
+    return values["hostname"], template.render(values)
+
+
+def _render_chunk(template: Template, port_template: Template, rows, main) -> list:
+    """Render a list of rows, run on the process pool."""
+    return [render_row(template, port_template, row, main) for row in rows]
+
+
+def render_rows(
+    rows: list,
+    main: bool,
+    template: str = TEMPLATE,
+    port_template: str = PORT_TEMPLATE,
+    workers: int | None = None,
+) -> list:
+    """
+    Render the configs of many site plan rows.
+
+    The templates are compiled once. Plans over PARALLEL_ROWS rows are
+    split in one chunk per worker and rendered on a process pool.
+
+    Args:
+        rows (list): site plan rows
+        main (bool): Main or Reserve switches
+        template (str): switch template, see TEMPLATE
+        port_template (str): per port template, see PORT_TEMPLATE
+        workers (int): processes, None for one per core
+    Returns:
+        list: (hostname, config text) per row, in order
+    """
+    compiled = Template(template)
+    compiled_port = Template(port_template)
+    if len(rows) <= PARALLEL_ROWS or workers == 1:
+        return _render_chunk(compiled, compiled_port, rows, main)
+    workers = workers or os.cpu_count() or 1
+    size = -(-len(rows) // workers)
+    chunks = []
+    for start in range(0, len(rows), size):
+        stop = start + size
+        chunks.append(rows[start:stop])
+    rendered = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(
+            _render_chunk,
+            [compiled] * len(chunks),
+            [compiled_port] * len(chunks),
+            chunks,
+            [main] * len(chunks),
+        ):
+            rendered += part
+    return rendered
+
+
+def duplicate_names(rendered: list) -> list:
+    """Return the hostnames rendered more than once, sorted."""
+    seen = set()
+    twice = set()
+    for name, _ in rendered:
+        if name in seen:
+            twice.add(name)
+        seen.add(name)
+    return sorted(twice)
+
+
+def write_configs(rendered: list, directory: str) -> int:
+    """
+    Write rendered configs as <hostname>.cfg, skipping unchanged ones.
+
+    A SHA-256 per file is kept in MANIFEST in (directory), so files whose
+    content did not change are not written again.
+
+    Args:
+        rendered (list): (hostname, config text) as from render_rows
+        directory (str): output directory, created when missing
+    Returns:
+        int: number of files written
+    Raises:
+        ValueError: when hostnames repeat, nothing is written then
+    """
+    clashes = duplicate_names(rendered)
+    if clashes:
+        raise ValueError(f"hostnames rendered more than once: {', '.join(clashes)}")
+    os.makedirs(directory, exist_ok=True)
+    manifest_file = os.path.join(directory, MANIFEST)
+    try:
+        with open(manifest_file, "r") as f:
+            hashes = json.load(f)
+    except (OSError, ValueError):
+        hashes = {}
+    written = 0
+    for name, text in rendered:
+        data = text.encode("latin-1")
+        digest = hashlib.sha256(data).hexdigest()
+        file = name + ".cfg"
+        path = os.path.join(directory, file)
+        if hashes.get(file) == digest and os.path.exists(path):
+            continue
+        with open(path, "wb") as f:
+            f.write(data)
+        hashes[file] = digest
+        written += 1
+    if written:
+        temp = manifest_file + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(hashes, f, indent=1, sort_keys=True)
+        os.replace(temp, manifest_file)
+    return written
+
+
+if __name__ == "__main__":
+    pass
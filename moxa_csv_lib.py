@@ -1,7 +1,334 @@
 #!/usr/bin/env python3
 # coding=utf-8
 """Module to work with csvfiles."""
+import json
+import os
+import stat
 from csv import DictReader, DictWriter
+from fcntl import LOCK_EX, LOCK_SH, LOCK_UN, flock
+from ipaddress import ip_address, ip_network
+from tempfile import NamedTemporaryFile
+
+# The (main, unconfigured) selections offered by AutoConf
+VIEWS = ((True, False), (False, False), (True, True), (False, True))
+
+
+def views_of(row: dict) -> set:
+    """
+    Return the views a plan row belongs to.
+
+    input:
+        row (dict) site plan row
+    Returns:
+        set of (main, unconfigured) tuples
+    """
+    views = set()
+    if row["SW"] != "1":
+        return views
+    views.add((True, False))
+    if row["DIPB"] != "":
+        views.add((False, False))
+        if row["MAC M"] == "":
+            views.add((True, True))
+    if row["DIPR"] != "" and row["MAC R"] == "":
+        views.add((False, True))
+    return views
+
+
+def validate_rows(rows: list, netmask: str = "255.255.255.0") -> list:
+    """
+    Check a site plan for conflicts before anything is pushed to a switch.
+
+    Switch IP addresses and MACs are hashed in one pass, so every
+    duplicate is reported together with the line it collides with.
+    Line numbers count the header as line 1.
+
+    input:
+        rows (list) site plan rows
+        netmask (str) mask used by Connection.conf_ip
+    Returns:
+        problems (list) one message per conflict, empty when valid
+    """
+    problems = []
+    seen_key = {}  # type: dict[tuple, int]
+    seen_ip = {}  # type: dict[str, int]
+    seen_mac = {}  # type: dict[str, int]
+    for line, row in enumerate(rows, start=2):
+        if row["SW"] != "1":
+            continue
+        key = (row["Cabinet"], row["AP"])
+        if row["AP"] == "":
+            problems.append(f"line {line}: {row['Cabinet']} has no AP")
+        elif key in seen_key:
+            problems.append(
+                f"line {line}: duplicate {key[0]} AP {key[1]}"
+                f" (line {seen_key[key]})"
+            )
+        seen_key.setdefault(key, line)
+        if row["Position"] == "":
+            problems.append(f"line {line}: {row['Cabinet']} has no Position")
+        switch_ip = row["Switch IP address"]
+        try:
+            network = ip_network(f"{ip_address(switch_ip)}/{netmask}", strict=False)
+        except ValueError:
+            problems.append(f"line {line}: malformed Switch IP address {switch_ip!r}")
+            network = None
+        if switch_ip in seen_ip:
+            problems.append(
+                f"line {line}: duplicate Switch IP address {switch_ip}"
+                f" (line {seen_ip[switch_ip]})"
+            )
+        seen_ip.setdefault(switch_ip, line)
+        ibc_ip = row.get("IBC IP address", "")
+        if network is not None and ibc_ip != "":
+            try:
+                if ip_address(ibc_ip) not in network:
+                    problems.append(
+                        f"line {line}: Switch IP address {switch_ip}"
+                        f" not in the subnet of IBC IP address {ibc_ip}"
+                    )
+            except ValueError:
+                problems.append(f"line {line}: malformed IBC IP address {ibc_ip!r}")
+        for column in ("MAC M", "MAC R"):
+            mac = row.get(column, "")
+            if mac == "":
+                continue
+            if mac in seen_mac:
+                problems.append(
+                    f"line {line}: {column} {mac} already recorded"
+                    f" (line {seen_mac[mac]})"
+                )
+            seen_mac.setdefault(mac, line)
+    return problems
+
+
+class SitePlan:
+    """
+    Site plan CSV held in memory.
+
+    Rows are indexed by (Cabinet, AP), Switch IP address and MAC. MAC
+    addresses are appended to a journal next to the CSV as they are
+    recorded and written to the CSV in batches, so recording a switch
+    never rewrites the whole file. The journal is replayed on load,
+    which makes unflushed MACs survive a crash.
+    """
+
+    def __init__(self, file: str, batch: int = 50) -> None:
+        """Initialize the class."""
+        self.file = file
+        self.journal = file + ".journal"
+        self.lockfile = file + ".lock"
+        self.batch = batch
+        self.pending = 0  # journal entries not yet in the CSV
+        self.offset = 0  # journal bytes already applied
+        self.stamp = (0, 0)  # CSV (mtime, size) when parsed
+        self.fieldnames = []  # type: list[str]
+        self.rows = []  # type: list[dict]
+        self.by_key = {}  # type: dict[tuple, list[int]]
+        self.by_ip = {}  # type: dict[str, list[int]]
+        self.by_mac = {}  # type: dict[str, list[int]]
+        self.views = {}  # type: dict[tuple, set[int]]
+        self.load()
+
+    def stat(self) -> tuple:
+        """Return the (mtime, size) stamp of the CSV."""
+        info = os.stat(self.file)
+        return (info.st_mtime_ns, info.st_size)
+
+    def _read(self) -> None:
+        """Parse the CSV and replay the journal on top of it."""
+        with open(self.file, "r") as f:
+            self.stamp = self.stat()
+            csvobject = DictReader(f, delimiter=",", quotechar='"')
+            self.rows = list(csvobject)
+            self.fieldnames = list(csvobject.fieldnames or [])
+        self.reindex()
+        self.offset = 0
+        self.pending = 0
+        self.replay()
+
+    def replay(self) -> None:
+        """Apply journal entries appended since the last replay."""
+        entries, self.offset = self.read_journal(self.offset)
+        for entry in entries:
+            self.apply(entry["cabinet"], entry["ap"], entry["mac"], entry["main"])
+        self.pending += len(entries)
+
+    def load(self) -> None:
+        """
+        Load the plan from disk, reparsing only when the CSV changed.
+
+        If the CSV has the same mtime and size as when it was parsed,
+        only new journal entries are applied.
+        """
+        try:
+            journal_size = os.path.getsize(self.journal)
+        except FileNotFoundError:
+            journal_size = 0
+        if self.stamp == self.stat() and journal_size >= self.offset:
+            self.replay()
+        else:
+            self._read()
+
+    def reindex(self) -> None:
+        """Rebuild all indexes from the rows."""
+        self.by_key = {}
+        self.by_ip = {}
+        self.by_mac = {}
+        self.views = {view: set() for view in VIEWS}
+        for num, row in enumerate(self.rows):
+            self.by_key.setdefault((row["Cabinet"], row["AP"]), []).append(num)
+            self.by_ip.setdefault(row["Switch IP address"], []).append(num)
+            for column in ("MAC M", "MAC R"):
+                if row.get(column):
+                    self.by_mac.setdefault(row[column], []).append(num)
+            for view in views_of(row):
+                self.views[view].add(num)
+
+    def read_journal(self, offset: int = 0) -> tuple:
+        """
+        Read the journal entries not yet written to the CSV.
+
+        Only complete lines are consumed, so a torn last line from an
+        interrupted append is left for the next read.
+
+        Args:
+            offset (int): byte position to start reading from
+        Returns:
+            entries (list), new offset (int)
+        """
+        entries = []
+        try:
+            with open(self.journal, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return entries, 0
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries, offset + end
+
+    def find(self, cabinet: str, ap: str) -> list:
+        """Return the rows for cabinet and AP."""
+        return [self.rows[num] for num in self.by_key.get((cabinet, ap), [])]
+
+    def find_ip(self, ip_add: str) -> list:
+        """Return the rows using a switch IP address."""
+        return [self.rows[num] for num in self.by_ip.get(ip_add, [])]
+
+    def find_mac(self, mac: str) -> list:
+        """Return the rows with a recorded MAC address."""
+        return [self.rows[num] for num in self.by_mac.get(mac, [])]
+
+    def apply(self, cabinet: str, ap: str, mac: str, main: bool) -> list:
+        """
+        Set the MAC address on the matching rows in memory only.
+
+        Returns:
+            changed row numbers (list)
+        """
+        column = "MAC M" if main else "MAC R"
+        changed = []
+        for num in self.by_key.get((cabinet, ap), []):
+            row = self.rows[num]
+            old = row.get(column)
+            if old == mac:
+                continue
+            if old and num in self.by_mac.get(old, []):
+                self.by_mac[old].remove(num)
+            row[column] = mac
+            self.by_mac.setdefault(mac, []).append(num)
+            members = views_of(row)
+            for view, nums in self.views.items():
+                if view in members:
+                    nums.add(num)
+                else:
+                    nums.discard(num)
+            changed.append(num)
+        return changed
+
+    def select(self, main: bool, unconfigured: bool) -> list:
+        """
+        Return the rows of a precomputed view, in file order.
+
+        input:
+            main (bool) Main or Reserve switches
+            unconfigured (bool) only rows without a recorded MAC
+        Returns:
+            rows (list)
+        """
+        return [self.rows[num] for num in sorted(self.views[(main, unconfigured)])]
+
+    def set_mac(self, cabinet: str, ap: str, mac: str, main: bool) -> list:
+        """
+        Record the MAC address for a row.
+
+        The change is appended to the journal before it is applied, and
+        the CSV is rewritten once (batch) changes are pending.
+
+        input:
+            cabinet(str) row to change
+            ap(str) row to change
+            mac(str) MAC to add row
+            main(bool) Main or Reserve Mac to add
+        Returns:
+            changed row numbers (list)
+        """
+        entry = {"cabinet": cabinet, "ap": ap, "mac": mac, "main": main}
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with open(self.lockfile, "w") as lock:
+            # Shared lock: appends may interleave, but not with a flush
+            flock(lock, LOCK_SH)
+            fd = os.open(self.journal, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+                flock(lock, LOCK_UN)
+        changed = self.apply(cabinet, ap, mac, main)
+        # Pick up our entry and any appended by other stations
+        self.replay()
+        if self.pending >= self.batch:
+            self.flush()
+        return changed
+
+    def flush(self) -> None:
+        """
+        Write journaled MACs to the CSV and empty the journal.
+
+        The CSV is re-read under a lock so entries journaled by other
+        processes are kept, then replaced atomically.
+        """
+        with open(self.lockfile, "w") as lock:
+            flock(lock, LOCK_EX)
+            try:
+                self._read()
+                directory = os.path.dirname(os.path.abspath(self.file))
+                with NamedTemporaryFile(
+                    "w", dir=directory, delete=False, newline=""
+                ) as tmp:
+                    data = DictWriter(
+                        tmp, delimiter=",", quotechar='"', fieldnames=self.fieldnames
+                    )
+                    data.writeheader()
+                    data.writerows(self.rows)
+                    tmp.flush()
+                    os.fsync(tmp.fileno())
+                # Keep the plan's permissions, the temp file is 0600
+                os.chmod(tmp.name, stat.S_IMODE(os.stat(self.file).st_mode))
+                os.replace(tmp.name, self.file)
+                with open(self.journal, "w"):
+                    pass
+                self.stamp = self.stat()
+                self.offset = 0
+                self.pending = 0
+            finally:
+                flock(lock, LOCK_UN)
 
 
 class ConfigFile:
@@ -9,12 +336,21 @@ class ConfigFile:
 
     def __init__(self) -> None:
         """Initialize the class."""
-        pass
+        self.plans = {}  # type: dict[str, SitePlan]
+
+    def plan(self, file: str) -> SitePlan:
+        """Return the loaded site plan for file."""
+        if file not in self.plans:
+            self.plans[file] = SitePlan(file)
+        return self.plans[file]
 
     def read_config(self, file: str) -> list:
         """
         Read CSV file and output dictionary.
 
+        The parsed file is cached and only reparsed when its mtime or
+        size changes on disk.
+
         Header - Cabinet,AP,SW,IOG,MBB,DIPB,MBR,DIPR,IBC IP address,
                  Switch IP address,Position,MAC M,MAC R
         input:
@@ -22,9 +358,49 @@ class ConfigFile:
         Outputs:
             parsed dictionary(list)
         """
-        with open(file, "r") as f:
-            config = list(DictReader(f, delimiter=",", quotechar='"'))
-        return config
+        plan = self.plan(file)
+        plan.load()
+        return plan.rows
+
+    def select(self, file: str, main: bool, unconfigured: bool) -> list:
+        """
+        Read CSV file and output the rows of one AutoConf view.
+
+        input:
+            csvfile (str)
+            main (bool) Main or Reserve switches
+            unconfigured (bool) only rows without a recorded MAC
+        Outputs:
+            parsed dictionary(list)
+        """
+        plan = self.plan(file)
+        plan.load()
+        return plan.select(main, unconfigured)
+
+    def find_mac(self, file: str, mac: str) -> list:
+        """
+        Return the rows of the CSV file with a recorded MAC address.
+
+        input:
+            csvfile (str)
+            mac (str)
+        Outputs:
+            parsed dictionary(list)
+        """
+        plan = self.plan(file)
+        plan.load()
+        return plan.find_mac(mac)
+
+    def validate(self, file: str) -> list:
+        """
+        Check the CSV file for conflicts, see validate_rows.
+
+        input:
+            csvfile (str)
+        Outputs:
+            problems (list)
+        """
+        return validate_rows(self.read_config(file))
 
     def write_config(
         self, file: str, cabinet: str, ap: str, mac: str, main: bool
@@ -38,24 +414,13 @@ class ConfigFile:
             mac(str) MAC to add row
             main(bool) Main or Reserve Mac to add
         """
-        with open(file, "r+") as f:
-            csvobject = DictReader(f, delimiter=",", quotechar='"')
-            if csvobject.fieldnames is not None:
-                fieldnames = csvobject.fieldnames
-            else:
-                fieldnames = ""
-            csvlist = list(csvobject)
-            for row in csvlist:
-                if row["Cabinet"] == cabinet and row["AP"] == ap:
-                    if main:
-                        row["MAC M"] = mac
-                    else:
-                        row["MAC R"] = mac
-
-            f.seek(0)
-            data = DictWriter(f, delimiter=",", quotechar='"', fieldnames=fieldnames)
-            data.writeheader()
-            data.writerows(csvlist)
+        self.plan(file).set_mac(cabinet, ap, mac, main)
+
+    def flush(self) -> None:
+        """Write all pending MAC addresses to their csv files."""
+        for plan in self.plans.values():
+            if plan.pending:
+                plan.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module to collect switch event logs into a local SQLite store."""
+import sqlite3
+import threading
+from time import mktime, strptime, time
+
+from moxa_ser_lib import event_severity, parse_eventlog
+
+# An entry is the same when all of these are, idx keeps apart equal lines
+KEY = "mac, idx, bootup, date, clock, uptime, event"
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS events ("
+    " mac TEXT NOT NULL, hostname TEXT, site TEXT, idx INTEGER, bootup TEXT,"
+    " date TEXT, clock TEXT, uptime TEXT, event TEXT NOT NULL, severity TEXT,"
+    f" stamp REAL, collected REAL, UNIQUE ({KEY}))",
+    "CREATE INDEX IF NOT EXISTS events_stamp ON events (stamp)",
+    "CREATE INDEX IF NOT EXISTS events_mac ON events (mac, stamp)",
+    "CREATE INDEX IF NOT EXISTS events_site ON events (site, stamp)",
+)
+
+
+def stamp(date: str, clock: str) -> float | None:
+    """Return the epoch seconds of an event log date and time, local time."""
+    try:
+        return mktime(strptime(f"{date} {clock}", "%Y/%m/%d %H:%M:%S"))
+    except ValueError:
+        return None
+
+
+class EventStore:
+    """
+    Event log entries of many switches, indexed by time and switch.
+
+    An entry is stored once: the same line read again on a later sweep
+    is ignored, while equal messages logged in the same second are kept
+    apart by their index. Each thread uses its own connection, like
+    moxa_sql_lib.SqlConfigFile.
+    """
+
+    def __init__(self, file: str, timeout: float = 10) -> None:
+        """Initialize the class."""
+        self.file = file
+        self.timeout = timeout
+        self.local = threading.local()
+        database = self.connect()
+        with database:
+            self.upgrade(database)
+            for statement in SCHEMA:
+                database.execute(statement)
+
+    def connect(self) -> sqlite3.Connection:
+        """Return this thread's connection to the store."""
+        if not hasattr(self.local, "database"):
+            database = sqlite3.connect(self.file, timeout=self.timeout)
+            database.row_factory = sqlite3.Row
+            database.execute("PRAGMA journal_mode=WAL")
+            database.execute("PRAGMA synchronous=NORMAL")
+            self.local.database = database
+        return self.local.database
+
+    @staticmethod
+    def upgrade(database: sqlite3.Connection) -> None:
+        """Rebuild a store made without idx in the key, keeping its entries."""
+        row = database.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'events'"
+        ).fetchone()
+        if row is None or f"UNIQUE ({KEY})" in row["sql"]:
+            return
+        database.execute("ALTER TABLE events RENAME TO events_old")
+        database.execute(SCHEMA[0])
+        database.execute("INSERT INTO events SELECT * FROM events_old")
+        # Its indexes go with it, SCHEMA makes them again for the new table
+        database.execute("DROP TABLE events_old")
+
+    def ingest(self, mac: str, hostname: str, site: str, eventlog: str) -> int:
+        """
+        Store the entries of one switch's event log.
+
+        Args:
+            mac (str): MAC address of the switch
+            hostname (str): system name of the switch
+            site (str): site the switch belongs to
+            eventlog (str): as returned by get_eventlog
+        Returns:
+            int: number of new entries
+        """
+        now = time()
+        rows = [
+            (mac, hostname, site, index, bootup, date, clock, uptime, event)
+            + (event_severity(event), stamp(date, clock), now)
+            for index, bootup, date, clock, uptime, event in parse_eventlog(eventlog)
+        ]
+        database = self.connect()
+        with database:
+            before = database.total_changes
+            marks = ", ".join("?" * 12)
+            database.executemany(f"INSERT OR IGNORE INTO events VALUES ({marks})", rows)
+            return database.total_changes - before
+
+    def query(
+        self,
+        since: float | None = None,
+        until: float | None = None,
+        mac: str | None = None,
+        site: str | None = None,
+        severity: str | None = None,
+        text: str | None = None,
+    ) -> list:
+        """
+        Return stored entries as dictionaries, oldest first.
+
+        Args:
+            since (float): epoch seconds, entries at or after
+            until (float): epoch seconds, entries before
+            mac (str): only this switch
+            site (str): only this site
+            severity (str): only "critical", "warning" or "info"
+            text (str): only events containing this, case insensitive
+        Returns:
+            list
+        """
+        where = []
+        args = []  # type: list
+        for clause, value in (
+            ("stamp >= ?", since),
+            ("stamp < ?", until),
+            ("mac = ?", mac),
+            ("site = ?", site),
+            ("severity = ?", severity),
+            ("event LIKE ?", None if text is None else f"%{text}%"),
+        ):
+            if value is not None:
+                where.append(clause)
+                args.append(value)
+        sql = "SELECT * FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        cursor = self.connect().execute(sql + " ORDER BY stamp, mac, idx", args)
+        return [dict(row) for row in cursor]
+
+
+def collect(conn, store: EventStore, site: str) -> int:
+    """
+    Read the event log of a logged in switch into the store.
+
+    Returns:
+        int: number of new entries
+    """
+    sysinfo = conn.get_sysinfo()
+    return store.ingest(sysinfo[4], sysinfo[0], site, conn.get_eventlog())
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module with an append-only journal of provisioning steps."""
+import json
+import os
+import threading
+from time import time
+
+SUFFIX = ".jobs"  # Journal file next to the site plan
+# Step recorded once the MAC is written to the site plan, the job is done then
+FINISHED = "write_back"
+
+
+def target(cabinet: str, ap: str, main: bool) -> str:
+    """Return the journal key for the Main or Reserve switch of a plan row."""
+    return f"{cabinet}/{ap}/{'M' if main else 'R'}"
+
+
+class JobJournal:
+    """
+    Record every provisioning step per target in an append-only file.
+
+    Each entry is one JSON line, written with a single append and
+    fsynced, so a crash loses at most the step that was running. A
+    torn last line is ignored on load. The journal tells a restarted
+    run which targets are finished and, for a switch that was half
+    done, which steps it can skip.
+
+    Entries: {"time", "target", "step", "ok", ...}, the login step
+    carries the MAC of the switch that was found.
+    """
+
+    def __init__(self, file: str) -> None:
+        """Initialize the class."""
+        self.file = file
+        self.lock = threading.Lock()
+        self.targets = {}  # type: dict[str, dict]
+        for entry in self.read():
+            self.apply(entry)
+
+    def read(self) -> list:
+        """Return all complete entries in the file."""
+        try:
+            with open(self.file, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        entries = []
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def apply(self, entry: dict) -> None:
+        """Update the per target state with one entry."""
+        state = self.targets.setdefault(
+            entry["target"], {"mac": None, "steps": set(), "finished": False}
+        )
+        if entry["step"] == "login" and entry.get("mac") != state["mac"]:
+            # Another switch on the cable, nothing it did counts
+            state["mac"] = entry.get("mac")
+            state["steps"] = set()
+        if entry["ok"]:
+            state["steps"].add(entry["step"])
+            if entry["step"] == FINISHED:
+                state["finished"] = True
+
+    def record(self, key: str, step: str, ok: bool = True, **fields) -> None:
+        """
+        Append one step outcome and apply it.
+
+        Args:
+            key (str): target, see target()
+            step (str): step name
+            ok (bool): whether the step succeeded
+            fields: extra values to store, like mac, seconds or error
+        """
+        entry = {"time": round(time(), 3), "target": key, "step": step, "ok": ok}
+        entry.update(fields)
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        with self.lock:
+            fd = os.open(self.file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.apply(entry)
+
+    def finished(self, key: str) -> bool:
+        """Return True when the target was provisioned and written back."""
+        with self.lock:
+            return self.targets.get(key, {}).get("finished", False)
+
+    def completed(self, key: str, mac: str) -> set:
+        """Return the steps already done on this switch for the target."""
+        with self.lock:
+            state = self.targets.get(key)
+            if state is None or state["mac"] != mac:
+                return set()
+            return set(state["steps"])
+
+    def started(self, mac: str) -> str | None:
+        """Return the unfinished target this switch did steps for, if any."""
+        with self.lock:
+            for key, state in self.targets.items():
+                if (
+                    state["mac"] == mac
+                    and not state["finished"]
+                    and state["steps"] - {"login"}
+                ):
+                    return key
+            return None
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module with the port layout of each supported switch model."""
+from array import array
+
+# Port positions of the EDS-408A front panel as (row, column, columnspan)
+LAYOUT_408 = [
+    (5, 1, 1),
+    (5, 3, 1),
+    (4, 1, 1),
+    (4, 3, 1),
+    (3, 1, 1),
+    (3, 3, 1),
+    (2, 0, 4),
+    (1, 0, 4),
+]
+
+
+def grid_layout(ports: int) -> list:
+    """Return a front panel layout, odd ports on top, even ones below."""
+    return [(1 + count % 2, count // 2, 1) for count in range(ports)]
+
+
+def make_profile(model: str, ports: int, layout=None, slot: int = 1) -> dict:
+    """
+    Build a model profile.
+
+    Args:
+        model (str): model name prefix as shown by show version
+        ports (int): number of ethernet ports
+        layout (list): (row, column, columnspan) per port, None for a grid
+        slot (int): module number in the interface names
+    Returns:
+        dict: model, ports, names ("1/1", ...), prompt (bytes, what the
+              CLI prompt of the model starts with) and layout
+    """
+    return {
+        "model": model,
+        "ports": ports,
+        "names": [f"{slot}/{count + 1}" for count in range(ports)],
+        "prompt": model.encode("latin-1"),
+        "layout": layout or grid_layout(ports),
+    }
+
+
+PROFILES = {
+    profile["model"]: profile
+    for profile in (
+        make_profile("EDS-405A", 5),
+        make_profile("EDS-408A", 8, LAYOUT_408),
+        make_profile("EDS-510A", 10),
+        make_profile("EDS-516A", 16),
+        make_profile("EDS-518A", 18),
+        make_profile("EDS-528E", 28),
+    )
+}
+DEFAULT = PROFILES["EDS-408A"]
+
+
+def profile_for(model: str) -> dict:
+    """
+    Return the profile of a model, the longest matching prompt wins.
+
+    Args:
+        model (str): as shown by show version or in the CLI prompt, like
+                     "EDS-408A-MM-SC"
+    Returns:
+        dict: see make_profile, DEFAULT when the model is unknown
+    """
+    name = model.encode("latin-1")
+    matches = [
+        profile for profile in PROFILES.values() if name.startswith(profile["prompt"])
+    ]
+    if not matches:
+        return DEFAULT
+    return max(matches, key=lambda profile: len(profile["prompt"]))
+
+
+def link_array(ifaces: list) -> array:
+    """Return link status per port as bytes, 1 for up."""
+    return array("B", (1 if status == "Up" else 0 for status in ifaces))
+
+
+def alarm_array(portconfig: list) -> array:
+    """Return relay-warning setting per port as bytes, 1 for alarm on."""
+    return array("B", (1 if setting == "Off" else 0 for setting in portconfig))
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module to share switch consoles between processes over a Unix socket."""
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+from array import array
+from contextlib import contextmanager
+from tempfile import gettempdir
+from time import monotonic, sleep
+
+from moxa_prov_lib import login
+from moxa_ser_lib import Connection
+
+
+def socket_path() -> str:
+    """Return the default socket, in a directory only this user can enter."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "moxa-mux.sock")
+    return os.path.join(gettempdir(), f"moxa-mux-{os.getuid()}", "moxa-mux.sock")
+
+
+SOCKET = socket_path()
+KEEPALIVE_S = 60.0  # Idle time before a session is checked
+LOGGED_IN = 2  # check_login result for a session the daemon keeps logged in
+
+# Connection methods clients may call, copy_firmware opens a path and is
+# replaced by send_firmware
+METHODS = frozenset(
+    (
+        "check_login",
+        "menu_login",
+        "cli_login",
+        "reset_conn",
+        "keepalive",
+        "close",
+        "get_sysinfo",
+        "get_version",
+        "detect_profile",
+        "get_ifaces",
+        "get_portconfig",
+        "get_ip",
+        "round_trip",
+        "get_clock",
+        "clock_offset",
+        "set_clock",
+        "login_change",
+        "conf_iface",
+        "conf_ip",
+        "conf_commands",
+        "conf_hostname",
+        "conf_location",
+        "factory_conf",
+        "save_run2startup",
+        "save_config",
+        "stream_config",
+        "get_running_config",
+        "compare_config",
+        "get_eventlog",
+        "clear_eventlog",
+        "send_firmware",
+        "copy_config",
+    )
+)
+# Connection methods that log out or restart the switch, the login is gone
+LOGOUTS = frozenset(
+    (
+        "menu_login",
+        "cli_login",
+        "reset_conn",
+        "factory_conf",
+        "send_firmware",
+        "copy_config",
+    )
+)
+# Connection data attributes mirrored on MuxConnection
+ATTRIBUTES = (
+    "prompt",
+    "cprompt",
+    "profile",
+    "relay_state",
+    "total_packets",
+    "success_count",
+    "error_count",
+)
+
+
+def encode(value):
+    """Make a value JSON safe, bytes become {"bytes": latin-1 text}."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"bytes": bytes(value).decode("latin-1")}
+    if isinstance(value, array):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    return value
+
+
+def decode(value):
+    """Undo encode."""
+    if isinstance(value, dict) and set(value) == {"bytes"}:
+        return value["bytes"].encode("latin-1")
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: decode(item) for key, item in value.items()}
+    return value
+
+
+def attributes(conn) -> dict:
+    """Return the mirrored data attributes of a Connection, encoded."""
+    return {name: encode(getattr(conn, name, None)) for name in ATTRIBUTES}
+
+
+class Session:
+    """
+    One serial console kept open and logged in by the daemon.
+
+    A client may hold the session for a sequence of calls, like a whole
+    provisioning run. Calls of other clients wait until it is released.
+    """
+
+    def __init__(self, device: str) -> None:
+        """Initialize the class."""
+        self.device = device
+        self.conn = None  # type: Connection | None
+        self.lock = threading.Lock()
+        self.holder = threading.Condition()
+        self.owner = None  # type: object | None
+        self.logged_in = False
+        self.last_used = monotonic()
+
+    def hold(self, client) -> None:
+        """Reserve the session for client, waiting for another holder."""
+        with self.holder:
+            self.holder.wait_for(lambda: self.owner in (None, client))
+            self.owner = client
+
+    def release(self, client) -> None:
+        """End the reservation of client, if it holds the session."""
+        with self.holder:
+            if self.owner is client:
+                self.owner = None
+                self.holder.notify_all()
+
+    def check_login(self, attempts: int = 0) -> int:
+        """Log in unless the session still is, LOGGED_IN when it is."""
+        if self.logged_in and self.alive():
+            return LOGGED_IN
+        result = login(self.conn, attempts)
+        self.logged_in = result >= 0
+        return LOGGED_IN if self.logged_in else result
+
+    def alive(self) -> bool:
+        """Return True when the console still answers at the prompt."""
+        try:
+            return self.conn.keepalive()
+        except Exception:  # noqa: B902 - nothing read, port gone or logged out
+            return False
+
+    def call(self, method: str, args: list, kwargs: dict, send, client) -> object:
+        """
+        Run one Connection method, one client at a time.
+
+        Args:
+            method (str): Connection method name
+            args (list): positional arguments
+            kwargs (dict): keyword arguments
+            send (callable): sends a message to the client before the result
+            client: the calling client, waits while another holds the session
+        """
+        with self.holder:
+            # Taken before the holder check ends, so no hold slips in between
+            self.holder.wait_for(lambda: self.owner in (None, client))
+            self.lock.acquire()
+        try:
+            self.last_used = monotonic()
+            if method == "close":
+                # The port stays open for the other clients
+                return None
+            if self.conn is None:
+                self.conn = Connection(device=self.device)
+            if method == "check_login":
+                return self.check_login(*args, **kwargs)
+            if method in LOGOUTS:
+                self.logged_in = False
+            if method == "stream_config":
+                sink = Chunks(send)
+                return self.conn.stream_config(sink, *args, **kwargs)
+            self.conn.on_progress = lambda: send({"attrs": attributes(self.conn)})
+            try:
+                return getattr(self.conn, method)(*args, **kwargs)
+            finally:
+                self.conn.on_progress = None
+        finally:
+            self.lock.release()
+
+    def keepalive(self, interval: float) -> None:
+        """Check an idle logged in session, unless a client is using it."""
+        if not self.logged_in or monotonic() - self.last_used < interval:
+            return
+        if self.owner is not None or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.logged_in = self.alive()
+            self.last_used = monotonic()
+        finally:
+            self.lock.release()
+
+
+class Chunks:
+    """File-like sink that forwards writes to a client."""
+
+    def __init__(self, send) -> None:
+        """Initialize the class."""
+        self.send = send
+
+    def write(self, data) -> int:
+        """Send one chunk."""
+        self.send({"chunk": encode(data)})
+        return len(data)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """Serve the requests of one client, one JSON line each."""
+
+    def handle(self) -> None:
+        """Answer requests until the client disconnects."""
+        held = set()
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                    session = self.server.session(request["device"])
+                    self.send({"result": encode(self.run(session, request, held))})
+                except Exception as error:  # noqa: B902 - handed to the client
+                    self.send({"error": f"{type(error).__name__}: {error}"})
+        finally:
+            for session in held:
+                session.release(self)
+
+    def run(self, session: Session, request: dict, held: set) -> object:
+        """Run one request and send the session's attributes."""
+        method = request["method"]
+        if method == "hold":
+            session.hold(self)
+            held.add(session)
+            return None
+        if method == "release":
+            session.release(self)
+            held.discard(session)
+            return None
+        if method not in METHODS:
+            raise ValueError(f"unknown method {method}")
+        try:
+            return session.call(
+                method,
+                decode(request.get("args", [])),
+                request.get("kwargs", {}),
+                self.send,
+                self,
+            )
+        finally:
+            if session.conn is not None:
+                self.send({"attrs": attributes(session.conn)})
+
+    def send(self, message: dict) -> None:
+        """Write one message to the client."""
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+def remove_stale(path: str) -> None:
+    """
+    Remove a socket left behind by a daemon that is gone.
+
+    Raises:
+        FileExistsError: when (path) is not a socket
+        OSError: when a daemon still answers on it
+    """
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(info.st_mode):
+        raise FileExistsError(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(f"a console multiplexer already serves {path}")
+
+
+class MuxServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Own the serial ports and serve their consoles to many clients.
+
+    Every device gets one Session, opened and logged in on first use and
+    kept logged in while idle. Requests from all clients for a device
+    run one after the other. The socket is created in a 0700 directory
+    with mode 0600 from the start.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str = SOCKET, keepalive: float = KEEPALIVE_S) -> None:
+        """Initialize the class."""
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700)
+        remove_stale(path)
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.__init__(self, path, Handler)
+        finally:
+            os.umask(umask)
+        self.path = path
+        self.interval = keepalive
+        self.sessions = {}  # type: dict[str, Session]
+        self.lock = threading.Lock()
+        threading.Thread(target=self._keepalive, daemon=True).start()
+
+    def session(self, device: str) -> Session:
+        """Return the session of a device, creating it on first use."""
+        with self.lock:
+            if device not in self.sessions:
+                self.sessions[device] = Session(device)
+            return self.sessions[device]
+
+    def _keepalive(self) -> None:
+        """Keep idle sessions logged in."""
+        while True:
+            sleep(self.interval / 4)
+            with self.lock:
+                sessions = list(self.sessions.values())
+            for session in sessions:
+                session.keepalive(self.interval)
+
+    def server_close(self) -> None:
+        """Close the socket and remove its file."""
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class MuxConnection:
+    """
+    Connection-compatible client of the console multiplexer.
+
+    Method calls are sent to the daemon and run on its Connection for
+    (device). check_login returns LOGGED_IN when the daemon already
+    holds a logged in session, which callers treat like any login. The
+    data attributes in ATTRIBUTES follow the daemon's after every call,
+    and during XMODEM transfers.
+    """
+
+    def __init__(self, device: str = "/dev/ttyUSB0", path: str = SOCKET) -> None:
+        """Initialize the class."""
+        self.device = device
+        self.lock = threading.Lock()
+        for name in ATTRIBUTES:
+            setattr(self, name, None)
+        self.total_packets = self.success_count = self.error_count = 0
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile("rwb")
+
+    def call(self, method: str, *args, sink=None, **kwargs):
+        """
+        Run a Connection method on the daemon.
+
+        Args:
+            method (str): Connection method name
+            sink: file-like object getting the chunks of stream_config
+        Raises:
+            RuntimeError: with the daemon's error message
+        """
+        request = {
+            "device": self.device,
+            "method": method,
+            "args": encode(list(args)),
+            "kwargs": kwargs,
+        }
+        with self.lock:
+            self.file.write((json.dumps(request) + "\n").encode("utf-8"))
+            self.file.flush()
+            while True:
+                line = self.file.readline()
+                if not line:
+                    raise RuntimeError("console multiplexer closed the connection")
+                message = json.loads(line)
+                if "chunk" in message:
+                    sink.write(decode(message["chunk"]))
+                elif "attrs" in message:
+                    for name, value in decode(message["attrs"]).items():
+                        setattr(self, name, value)
+                elif "error" in message:
+                    raise RuntimeError(message["error"])
+                else:
+                    return decode(message["result"])
+
+    @contextmanager
+    def hold(self):
+        """Keep other clients off the console for the calls in the block."""
+        self.call("hold")
+        try:
+            yield self
+        finally:
+            self.call("release")
+
+    def stream_config(self, sink, *args, **kwargs) -> int:
+        """Write a config to sink as the daemon reads it."""
+        return self.call("stream_config", *args, sink=sink, **kwargs)
+
+    def copy_firmware(self, file: str) -> bool:
+        """Send a firmware file, read here, the daemon opens no paths."""
+        with open(file, "rb") as f:
+            return self.call("send_firmware", f.read())
+
+    def close(self) -> None:
+        """Disconnect from the daemon, the console stays logged in there."""
+        self.file.close()
+        self.socket.close()
+
+    def __getattr__(self, name: str):
+        """Forward Connection methods to the daemon."""
+        if name not in METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+
+@contextmanager
+def held(conn):
+    """Hold a multiplexed console for a block, a plain Connection is owned."""
+    if isinstance(conn, MuxConnection):
+        with conn.hold():
+            yield conn
+    else:
+        yield conn
+
+
+def open_connection(device: str, path: str = SOCKET, verbose: bool = False):
+    """Return a client of the running multiplexer, else the port itself."""
+    if os.path.exists(path):
+        try:
+            return MuxConnection(device, path)
+        except OSError:
+            pass  # Stale socket file, no daemon
+    return Connection(device=device, verbose=verbose)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module with the provisioning steps shared by the GUI and the CLI."""
+import re
+from time import monotonic, perf_counter, sleep
+
+from moxa_conf_lib import NETMASK, apply_state
+from moxa_model_lib import link_array
+
+LOGIN_ATTEMPTS = 5  # Port reads per login try before reporting no switch
+NO_ANSWER = -2  # check_login result when nothing answered on the console
+REBOOT_S = 180.0  # Longest wait for the switch to come back after an import
+
+
+def login(conn, attempts: int = LOGIN_ATTEMPTS) -> int:
+    """
+    Log in on the console, changing menu login to cli login.
+
+    Args:
+        conn (Connection): switch to log in on
+        attempts (int): reads before giving up, 0 is forever for the
+                        first read, the read after the menu login is
+                        always bounded
+    Returns:
+        int: check_login result, NO_ANSWER when no switch answered
+    """
+    logincheck = conn.check_login(attempts)
+    if logincheck == 0:
+        conn.menu_login()
+        if not conn.reset_conn(attempts or LOGIN_ATTEMPTS):
+            return NO_ANSWER
+        sleep(2)
+        conn.cli_login()
+    elif logincheck == 1:
+        conn.cli_login()
+    return logincheck
+
+
+def alarm_ports(ifaces: list, ports: int = 8) -> list:
+    """
+    Return the alarm setting for each port, on where the link is up.
+
+    Args:
+        ifaces (list): port status as returned by get_ifaces
+        ports (int): port count of the model, shorter lists are padded
+    Returns:
+        list: 1 for alarm on, 0 for off
+    """
+    links = link_array(ifaces)
+    return links.tolist() + [0] * (ports - len(links))
+
+
+# Settings each provisioning step writes, as parsed by parse_running_config
+STEP_FIELDS = {
+    "hostname": ("hostname",),
+    "location": ("location",),
+    "ip": ("ip", "netmask"),
+    "alarms": ("alarms",),
+}
+
+
+def still_done(conn, done: set, desired: dict, names=None) -> set:
+    """
+    Return the steps of (done) whose settings the switch still runs.
+
+    Steps before save only change the running config, so a switch that
+    restarted since has lost them.
+    """
+    current = parse_running_config(conn.get_running_config(), names)
+    kept = set()
+    for step in done:
+        fields = STEP_FIELDS.get(step)
+        if fields is None or all(current[key] == desired[key] for key in fields):
+            kept.add(step)
+    return kept
+
+
+def timed(timings: dict, log, step: str, start: float) -> None:
+    """Store the seconds since start for a finished step and report it."""
+    seconds = round(perf_counter() - start, 3)
+    timings[step] = seconds
+    if log is not None:
+        log(step, seconds)
+
+
+def provision(
+    conn,
+    name: str,
+    location: str,
+    ip_add: str,
+    ports: list,
+    timings=None,
+    log=None,
+    done=(),
+    names=None,
+) -> str:
+    """
+    Write hostname, location, IP and alarms to the switch and save.
+
+    Args:
+        conn (Connection): logged in switch
+        name (str): hostname
+        location (str): location
+        ip_add (str): management IP address
+        ports (list): alarm setting per port
+        timings (dict): filled with seconds per step when given
+        log (callable): called as log(step, seconds) after each step
+        done (set): steps already done on this switch, skipped. Until
+                    save is among them, they are checked against the
+                    running config first.
+        names (list): interface names of the model profile, None for 1/N
+    Returns:
+        str: MAC address of the switch
+    Raises:
+        RuntimeError: when the IP address or the save is refused
+    """
+    if timings is None:
+        timings = {}
+    if done and "save" not in done:
+        desired = desired_state(name, location, ip_add, ports, names)
+        done = still_done(conn, set(done), desired, names)
+
+    def set_ip() -> None:
+        status = conn.conf_ip(ip_add)
+        if status == 1:
+            raise RuntimeError(f"malformed IP address {ip_add}")
+        if status != -1:
+            raise RuntimeError(f"switch did not take IP address {ip_add}")
+
+    def save() -> None:
+        if not conn.save_run2startup():
+            raise RuntimeError("saving running config to startup failed")
+
+    steps = (
+        ("hostname", lambda: conn.conf_hostname(name)),
+        ("location", lambda: conn.conf_location(location)),
+        ("ip", set_ip),
+        ("alarms", lambda: conn.conf_iface(ports)),
+        ("save", save),
+        ("mac", lambda: conn.get_sysinfo()[4]),
+    )
+    result = None
+    for step, func in steps:
+        if step in done and step != "mac":
+            continue
+        start = perf_counter()
+        result = func()
+        timed(timings, log, step, start)
+    return result
+
+
+def parse_running_config(config: str, names=None) -> dict:
+    """
+    Parse the settings provisioning cares about from a running config.
+
+    Args:
+        config (str): as returned by get_running_config
+        names (list): interface names of the model profile, index is the
+                      port, None to use the number after the slash
+    Returns:
+        dict: hostname, location, ip, netmask (str or None) and
+              alarms ({port index: 1} for ports with link-off warning)
+    """
+    state = {
+        "hostname": None,
+        "location": None,
+        "ip": None,
+        "netmask": None,
+        "alarms": {},
+    }
+    section = ""
+    for line in config.splitlines():
+        stripped = line.strip()
+        if not line.startswith(" "):
+            section = stripped
+        if stripped.startswith("hostname "):
+            state["hostname"] = stripped.split(" ", 1)[1].strip('"')
+        elif stripped.startswith("snmp-server location "):
+            state["location"] = stripped.split(" ", 2)[2].strip('"')
+        elif section == "interface mgmt" and stripped.startswith("ip address static"):
+            fields = stripped.split()
+            state["ip"] = fields[3] if len(fields) > 3 else None
+            state["netmask"] = fields[4] if len(fields) > 4 else None
+        elif stripped in (
+            "relay-warning event link-off",
+            "no relay-warning event link",
+        ):
+            match = re.match(r"interface ethernet (\d+/(\d+))", section)
+            if match is None:
+                continue
+            if names and match.group(1) in names:
+                index = names.index(match.group(1))
+            else:
+                index = int(match.group(2)) - 1
+            if stripped.startswith("no "):
+                state["alarms"].pop(index, None)
+            else:
+                state["alarms"][index] = 1
+    return state
+
+
+def desired_state(
+    name: str, location: str, ip_add: str, ports: list, names=None
+) -> dict:
+    """Return the state provisioning should leave, like parse_running_config."""
+    return {
+        "hostname": name,
+        "location": location,
+        "ip": ip_add,
+        "netmask": NETMASK,
+        "alarms": {count: 1 for count, alarm in enumerate(ports) if alarm == 1},
+        "ports": len(ports),
+        "names": names or [f"1/{count + 1}" for count in range(len(ports))],
+    }
+
+
+def plan_commands(current: dict, desired: dict) -> list:
+    """
+    Return the configure mode commands that turn current into desired.
+
+    Returns:
+        list: command lines as bytes, empty when nothing differs
+    """
+    commands = []
+    if current["hostname"] != desired["hostname"]:
+        commands.append(b"hostname " + desired["hostname"].encode("latin-1"))
+    if current["location"] != desired["location"]:
+        commands.append(
+            b"snmp-server location " + desired["location"].encode("latin-1")
+        )
+    if (current["ip"], current["netmask"]) != (desired["ip"], desired["netmask"]):
+        commands += [
+            b"interface mgmt",
+            b"ip address static "
+            + f"{desired['ip']} {desired['netmask']}".encode("latin-1"),
+            b"exit",
+        ]
+    for count in range(desired["ports"]):
+        wanted = desired["alarms"].get(count, 0)
+        if current["alarms"].get(count, 0) == wanted:
+            continue
+        name = desired["names"][count]
+        commands.append(b"interface ethernet " + name.encode("latin-1"))
+        if wanted:
+            commands.append(b"relay-warning event link-off")
+        else:
+            commands.append(b"no relay-warning event link")
+        commands.append(b"exit")
+    return commands
+
+
+def reconcile(
+    conn,
+    name: str,
+    location: str,
+    ip_add: str,
+    ports: list,
+    timings=None,
+    log=None,
+    names=None,
+) -> str:
+    """
+    Bring the switch to the wanted state sending only what differs.
+
+    The running config is read once, the missing commands are sent in
+    one batch, and one more read verifies the result before saving.
+    When the running config already matches, the startup config is
+    checked too, so settings applied but never saved get saved. A
+    switch that matches in both is left alone.
+
+    Args:
+        conn (Connection): logged in switch
+        name (str): hostname
+        location (str): location
+        ip_add (str): management IP address
+        ports (list): alarm setting per port
+        timings (dict): filled with seconds per step when given
+        log (callable): called as log(step, seconds) after each step
+        names (list): interface names of the model profile, None for 1/N
+    Returns:
+        str: MAC address of the switch
+    Raises:
+        RuntimeError: when the switch does not match after applying
+    """
+    if timings is None:
+        timings = {}
+    desired = desired_state(name, location, ip_add, ports, names)
+    start = perf_counter()
+    commands = plan_commands(
+        parse_running_config(conn.get_running_config(), names), desired
+    )
+    timed(timings, log, "read", start)
+    unsaved = False
+    if commands:
+        start = perf_counter()
+        conn.conf_commands(commands)
+        timed(timings, log, "apply", start)
+        start = perf_counter()
+        left = plan_commands(
+            parse_running_config(conn.get_running_config(), names), desired
+        )
+        timed(timings, log, "verify", start)
+        if left:
+            raise RuntimeError(f"switch did not take {left}")
+    else:
+        start = perf_counter()
+        unsaved = bool(
+            plan_commands(parse_running_config(conn.save_config(), names), desired)
+        )
+        timed(timings, log, "startup", start)
+    if commands or unsaved:
+        start = perf_counter()
+        if not conn.save_run2startup():
+            raise RuntimeError("saving running config to startup failed")
+        timed(timings, log, "save", start)
+    start = perf_counter()
+    mac = conn.get_sysinfo()[4]
+    timed(timings, log, "mac", start)
+    return mac
+
+
+def push_config(
+    conn,
+    name: str,
+    location: str,
+    ip_add: str,
+    ports: list,
+    timings=None,
+    log=None,
+    names=None,
+    abort=None,
+) -> str:
+    """
+    Bring the switch to the wanted state with one config file import.
+
+    The running config is read once and patched with the wanted
+    settings, the whole file goes over XMODEM, and the switch is
+    verified after it restarts with the imported config. A switch that
+    already matches is left alone.
+
+    Args:
+        conn (Connection): logged in switch
+        name (str): hostname
+        location (str): location
+        ip_add (str): management IP address
+        ports (list): alarm setting per port
+        timings (dict): filled with seconds per step when given
+        log (callable): called as log(step, seconds) after each step
+        names (list): interface names of the model profile, None for 1/N
+        abort (callable): returns True to stop waiting for the restart
+    Returns:
+        str: MAC address of the switch
+    Raises:
+        RuntimeError: when the transfer fails, the switch does not come
+                      back, the wait is aborted or it does not match
+                      afterwards
+    """
+    if timings is None:
+        timings = {}
+    desired = desired_state(name, location, ip_add, ports, names)
+    start = perf_counter()
+    config = conn.get_running_config()
+    commands = plan_commands(parse_running_config(config, names), desired)
+    timed(timings, log, "read", start)
+    if commands:
+        start = perf_counter()
+        if not conn.copy_config(apply_state(config, desired).encode("latin-1")):
+            raise RuntimeError("config file transfer failed")
+        timed(timings, log, "transfer", start)
+        start = perf_counter()
+        deadline = monotonic() + REBOOT_S
+        while login(conn) < 0:
+            if abort is not None and abort():
+                raise RuntimeError("aborted waiting for the switch to restart")
+            if monotonic() > deadline:
+                raise RuntimeError("switch did not come back after the import")
+        timed(timings, log, "restart", start)
+        start = perf_counter()
+        left = plan_commands(
+            parse_running_config(conn.get_running_config(), names), desired
+        )
+        timed(timings, log, "verify", start)
+        if left:
+            raise RuntimeError(f"switch did not take {left}")
+    start = perf_counter()
+    mac = conn.get_sysinfo()[4]
+    timed(timings, log, "mac", start)
+    return mac
+
+
+if __name__ == "__main__":
+    pass
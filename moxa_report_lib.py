@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module to report provisioning throughput from job journals."""
+import html
+from csv import writer
+
+from moxa_journal_lib import FINISHED, JobJournal
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values: list, pct: int) -> float:
+    """Return the nearest-rank percentile of values, sorted or not."""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+def runs(entries: list) -> list:
+    """
+    Group journal entries into runs, one switch on one port each.
+
+    A run starts with the first entry of a target on a port and ends
+    with its write_back, firmware or failed entry.
+
+    Returns:
+        list: dictionaries with port, target, start, end, ok and logins
+    """
+    open_runs = {}  # type: dict[tuple, dict]
+    done = []
+    for entry in sorted(entries, key=lambda entry: entry["time"]):
+        key = (entry.get("port", ""), entry["target"])
+        run = open_runs.get(key)
+        if run is None:
+            # Waiting for a switch to answer is idle time, not work
+            wait = 0.0 if entry["step"] == "login" else entry.get("seconds", 0.0)
+            run = {
+                "port": key[0],
+                "target": key[1],
+                "start": entry["time"] - wait,
+                "logins": 0,
+            }
+            open_runs[key] = run
+        if entry["step"] == "login":
+            run["logins"] += 1
+        if entry["step"] in (FINISHED, "firmware", "failed"):
+            run["end"] = entry["time"]
+            run["ok"] = entry["ok"] and entry["step"] != "failed"
+            done.append(open_runs.pop(key))
+    return done
+
+
+def summarize(entries: list) -> dict:
+    """
+    Aggregate journal entries into throughput, latency and failure figures.
+
+    Returns:
+        dict: "ports" {port: figures}, "steps" {step: figures} and "total"
+    """
+    finished = runs(entries)
+    ports = {}
+    for run in finished:
+        ports.setdefault(run["port"], []).append(run)
+    port_figures = {}
+    for port, port_runs in sorted(ports.items()):
+        port_runs.sort(key=lambda run: run["start"])
+        span = port_runs[-1]["end"] - port_runs[0]["start"]
+        busy = sum(run["end"] - run["start"] for run in port_runs)
+        idle = sum(
+            max(0.0, later["start"] - earlier["end"])
+            for earlier, later in zip(port_runs, port_runs[1:])
+        )
+        configured = sum(1 for run in port_runs if run["ok"])
+        port_figures[port or "-"] = {
+            "runs": len(port_runs),
+            "configured": configured,
+            "failed": len(port_runs) - configured,
+            "per_hour": round(configured * 3600 / span, 2) if span > 0 else 0.0,
+            "busy_s": round(busy, 1),
+            "idle_s": round(idle, 1),
+        }
+    seconds = {}
+    for entry in entries:
+        if "seconds" in entry and entry["ok"]:
+            seconds.setdefault(entry["step"], []).append(entry["seconds"])
+    step_figures = {}
+    for step, values in sorted(seconds.items()):
+        figures = {"count": len(values)}
+        for pct in PERCENTILES:
+            figures[f"p{pct}_s"] = percentile(values, pct)
+        step_figures[step] = figures
+    attempts = len(finished)
+    failed = sum(1 for run in finished if not run["ok"])
+    targets = {run["target"] for run in finished}
+    total = {
+        "runs": attempts,
+        "configured": attempts - failed,
+        "failure_rate": round(failed / attempts, 3) if attempts else 0.0,
+        "retry_rate": (
+            round((attempts - len(targets)) / len(targets), 3) if targets else 0.0
+        ),
+        "relogins": sum(max(0, run["logins"] - 1) for run in finished),
+    }
+    return {"ports": port_figures, "steps": step_figures, "total": total}
+
+
+def load(files: list) -> list:
+    """Read the entries of one or more job journals."""
+    entries = []
+    for file in files:
+        entries += JobJournal(file).read()
+    return entries
+
+
+def write_csv(summary: dict, file: str) -> None:
+    """Write a summary as CSV, one section, name, metric, value per line."""
+    with open(file, "w", newline="") as f:
+        data = writer(f)
+        data.writerow(["section", "name", "metric", "value"])
+        for metric, value in summary["total"].items():
+            data.writerow(["total", "", metric, value])
+        for section in ("ports", "steps"):
+            for name, figures in summary[section].items():
+                for metric, value in figures.items():
+                    data.writerow([section, name, metric, value])
+
+
+def _table(title: str, rows: dict) -> str:
+    """Return an HTML table of {name: figures}."""
+    if not rows:
+        return f"<h2>{html.escape(title)}</h2><p>No data</p>"
+    metrics = list(next(iter(rows.values())))
+    head = "".join(f"<th>{html.escape(metric)}</th>" for metric in [""] + metrics)
+    body = "".join(
+        "<tr><th>"
+        + html.escape(name)
+        + "</th>"
+        + "".join(f"<td>{figures[metric]}</td>" for metric in metrics)
+        + "</tr>"
+        for name, figures in rows.items()
+    )
+    return f"<h2>{html.escape(title)}</h2><table><tr>{head}</tr>{body}</table>"
+
+
+def write_html(summary: dict, file: str) -> None:
+    """Write a summary as a standalone HTML page."""
+    page = (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        "<title>Provisioning report</title><style>"
+        "table{border-collapse:collapse}td,th{border:1px solid #999;"
+        "padding:2px 6px;text-align:right}</style></head><body>"
+        "<h1>Provisioning report</h1>"
+        + _table("Total", {"all": summary["total"]})
+        + _table("Per port", summary["ports"])
+        + _table("Step latency", summary["steps"])
+        + "</body></html>\n"
+    )
+    with open(file, "w") as f:
+        f.write(page)
+
+
+if __name__ == "__main__":
+    pass
@@ -4,17 +4,47 @@ Moxalib.
 
 This module uses a serial connection to communicate with moxa eds routers
 for common configuring.
-
-Todo:
-    # set time : configure -> clock set hh:mm:ss month day year
-
 """
+import json
+import os
 import re
-from time import sleep
+import threading
+from collections import deque
+from io import BytesIO
+from tempfile import mkstemp
+from time import localtime, monotonic, sleep, strftime, time
+from array import array
 from ipaddress import ip_address
 from serial import Serial  # type: ignore
 from xmodem import XMODEM, NAK  # type: ignore
 
+from moxa_model_lib import alarm_array, profile_for
+
+
+def port_column(text: str, offset: int) -> list:
+    """
+    Read one column of a per-port table.
+
+    The column starts (offset) characters after the port name, like
+    "1/1" or "1/12", as tables keep their columns aligned.
+
+    Args:
+        text (str): command output
+        offset (int): start of the column from the start of the port name
+    Returns:
+        list: first word of the column, one per port line
+    """
+    column = []
+    for line in text.splitlines():
+        port = re.match(r"\s*(\d+/\d+)", line)
+        if port is None:
+            continue
+        start = port.start(1) + offset
+        word = re.match(r"\w+", line[start:])
+        if word is not None:
+            column.append(word.group())
+    return column
+
 
 def expect(buffer: list, wtf: list) -> int:
     """
@@ -29,6 +59,8 @@ def expect(buffer: list, wtf: list) -> int:
              -1 if nothing found,
              -2 if empty buffer
     """
+    if not buffer:
+        return -2
     findval = buffer[-1]
     for index, value in enumerate(wtf):
         if findval.find(value) != -1:
@@ -36,6 +68,263 @@ def expect(buffer: list, wtf: list) -> int:
     return -1
 
 
+# Keywords deciding the severity of an event log entry, first match wins
+SEVERITIES = (
+    ("critical", ("fail", "error", "power off", "overheat", "attack")),
+    ("warning", ("link off", "link down", "disconnect", "changed", "lost")),
+)
+
+
+def event_severity(event: str) -> str:
+    """
+    Classify an event log message.
+
+    Args:
+        event (str): event text
+    Returns:
+        str: "critical", "warning" or "info"
+    """
+    lowered = event.lower()
+    for severity, keywords in SEVERITIES:
+        for keyword in keywords:
+            if keyword in lowered:
+                return severity
+    return "info"
+
+
+def parse_eventlog(eventlog: str) -> list:
+    """
+    Parse the output of get_eventlog into entries.
+
+    Header and separator lines are skipped.
+
+    Args:
+        eventlog (str): event log as returned by get_eventlog
+    Returns:
+        list: one list per entry
+              0: Index (int), 1: Bootup, 2: Date, 3: Time,
+              4: System Startup Time, 5: Event
+    """
+    entries = []
+    for line in eventlog.splitlines():
+        match = re.match(r"\s*(\d+)\s+(\d+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(.*\S)", line)
+        if match:
+            fields = list(match.groups())
+            fields[0] = int(fields[0])
+            entries.append(fields)
+            continue
+        match = re.match(r"\s*(\d+)\s+(.*\S)", line)
+        if match:
+            entries.append([int(match.group(1)), "", "", "", "", match.group(2)])
+    return entries
+
+
+class SerialBuffer:
+    """
+    Drain a serial port into a reusable buffer.
+
+    Everything waiting on the port is read in one go, and the result is
+    handed out as a memoryview over the buffer, so nothing is copied or
+    decoded until the caller asks for it.
+    """
+
+    def __init__(self, serial: Serial, size: int = 65536) -> None:
+        """Initialize the class."""
+        self.serial = serial
+        self.buffer = bytearray(size)
+        self.length = 0
+        self.found = False  # Whether the last read saw its terminator
+
+    def _grow(self, needed: int) -> None:
+        """Make room for at least (needed) bytes, keeping old views valid."""
+        size = len(self.buffer)
+        while size < needed:
+            size *= 2
+        length = self.length
+        buffer = bytearray(size)
+        buffer[:length] = self.buffer[:length]
+        self.buffer = buffer
+
+    def read_until(self, terminator: bytes, append: bool = False) -> memoryview:
+        """
+        Read until terminator is seen or the port times out.
+
+        Args:
+            terminator (bytes): what to stop at, usually a prompt
+            append (bool): keep the previous read in the buffer
+        Returns:
+            memoryview: the bytes read by this call
+        """
+        if not append:
+            self.length = 0
+        start = self.length
+        self.found = False
+        while True:
+            waiting = self.serial.in_waiting
+            # Block for one byte (up to the port timeout) when nothing waits
+            chunk = self.serial.read(waiting or 1)
+            if not chunk:
+                break
+            begin = self.length
+            end = begin + len(chunk)
+            if end > len(self.buffer):
+                self._grow(end)
+            self.buffer[begin:end] = chunk
+            search = max(start, begin - len(terminator) + 1)
+            self.length = end
+            if self.buffer.find(terminator, search, end) != -1:
+                self.found = True
+                break
+        length = self.length
+        return memoryview(self.buffer)[start:length]
+
+    def read_lines(
+        self, terminator: bytes, head: int, tail: int = 1, append: bool = False
+    ) -> memoryview:
+        """
+        Read until terminator and drop leading and trailing lines.
+
+        Args:
+            terminator (bytes): what to stop at, usually a prompt
+            head (int): number of lines to drop at the start (command echo)
+            tail (int): number of lines to drop at the end (prompt)
+            append (bool): keep the previous read in the buffer
+        Returns:
+            memoryview: the remaining lines, with line endings
+        """
+        view = self.read_until(terminator, append)
+        start = self.length - len(view)
+        end = self.length
+        for _ in range(head):
+            newline = self.buffer.find(b"\n", start, end)
+            if newline == -1:
+                start = end
+                break
+            start = newline + 1
+        for _ in range(tail):
+            if end <= start:
+                break
+            end = max(start, self.buffer.rfind(b"\n", start, end - 1) + 1)
+        return memoryview(self.buffer)[start:end]
+
+
+# Command classes with their (starting, longest) timeout in seconds
+TIMEOUT_CLASSES = {
+    "show": (1.0, 10.0),  # short show commands
+    "config": (1.0, 10.0),  # one configure mode line
+    "batch": (5.0, 60.0),  # conf_commands batches
+    "dump": (5.0, 60.0),  # running/startup config and event log
+    "save": (10.0, 60.0),  # save running config to startup
+    "reload": (30.0, 120.0),  # reload factory-default
+}
+TIMEOUT_FILE = os.path.expanduser("~/.moxaconf_timeouts.json")
+TIMEOUT_LOCK = threading.Lock()  # Stations of one process share TIMEOUT_FILE
+CLOCK_SET = "clock set %H:%M:%S %b %d %Y\n"  # strftime format of the command
+
+
+class Timeouts:
+    """
+    Per command class timeouts learned from observed latency.
+
+    Every answered read records how long it took. Once a class has
+    (min_samples) samples its timeout is the 99th percentile times
+    (factor) plus (margin) seconds, within (floor) and the class
+    maximum; until then the starting value is used. A read that times
+    out records twice its timeout, so a class that was cut too short
+    grows again.
+
+    Samples are kept per device model and serial adapter, and saved to
+    (file) every (save_every) samples, None to keep them in memory.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        file: str | None = TIMEOUT_FILE,
+        window: int = 200,
+        min_samples: int = 20,
+        factor: float = 1.5,
+        margin: float = 0.2,
+        floor: float = 0.2,
+        save_every: int = 50,
+    ) -> None:
+        """Initialize the class."""
+        self.key = key
+        self.file = file
+        self.min_samples = min_samples
+        self.factor = factor
+        self.margin = margin
+        self.floor = floor
+        self.save_every = save_every
+        self.unsaved = 0
+        self.samples = {
+            kind: deque(maxlen=window) for kind in TIMEOUT_CLASSES
+        }  # type: dict[str, deque]
+        for kind, values in self._load().get(key, {}).items():
+            if kind in self.samples:
+                self.samples[kind].extend(values)
+
+    def _load(self) -> dict:
+        """Return everything stored in the file, empty when unreadable."""
+        if self.file is None:
+            return {}
+        try:
+            with open(self.file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def timeout(self, kind: str) -> float:
+        """Return the timeout for a command class."""
+        start, longest = TIMEOUT_CLASSES[kind]
+        samples = self.samples[kind]
+        if len(samples) < self.min_samples:
+            return start
+        ordered = sorted(samples)
+        p99 = ordered[max(0, -(-len(ordered) * 99 // 100) - 1)]
+        return min(longest, max(self.floor, p99 * self.factor + self.margin))
+
+    def record(self, kind: str, seconds: float, answered: bool) -> None:
+        """Record one read, answered or timed out."""
+        if not answered:
+            seconds = 2 * self.timeout(kind)
+        self.samples[kind].append(round(seconds, 4))
+        self.unsaved += 1
+        if self.file is not None and self.unsaved >= self.save_every:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Write the samples to the file, keeping other keys.
+
+        Saving is best effort: an unwritable file only keeps the samples
+        in memory, it never fails the serial read that triggered it.
+        """
+        if self.file is None:
+            return
+        self.unsaved = 0
+        with TIMEOUT_LOCK:
+            stored = self._load()
+            stored[self.key] = {
+                kind: list(values) for kind, values in self.samples.items()
+            }
+            temp = None
+            try:
+                fd, temp = mkstemp(dir=os.path.dirname(os.path.abspath(self.file)))
+                with os.fdopen(fd, "w") as f:
+                    json.dump(stored, f)
+                os.replace(temp, self.file)
+                temp = None
+            except OSError:
+                pass
+            finally:
+                if temp is not None:
+                    try:
+                        os.unlink(temp)
+                    except OSError:
+                        pass
+
+
 class Connection:
     """Function on a serial object for moxa EDS routers."""
 
@@ -47,6 +336,7 @@ class Connection:
         prompt: bytes = b"EDS-408A-MM-SC",
         xonxoff: bool = True,
         verbose: bool = False,
+        timeout_file: str | None = TIMEOUT_FILE,
     ) -> None:
         """Initialize the class."""
         self.device = device
@@ -55,43 +345,101 @@ class Connection:
         self.xonxoff = xonxoff
         self.verbose = verbose
         self.p_end = b"#"
-        self.prompt = prompt + self.p_end
-        self.cprompt = prompt + b"(config)" + self.p_end
-        self.iprompt = prompt + b"(config-if)" + self.p_end
-        self.vprompt = prompt + b"(config-vlan)" + self.p_end
+        self.set_prompt(prompt)
         self.serial = Serial(
             port=self.device,
             baudrate=self.baud,
             timeout=self.timeout,
             xonxoff=self.xonxoff,
         )
+        self.reader = SerialBuffer(self.serial)
+        # Port count and names, see detect_profile
+        self.profile = profile_for(prompt.decode("latin-1"))
+        # Learned timeouts, kept per device model and serial adapter
+        self.timeouts = Timeouts(prompt.decode("latin-1") + "@" + device, timeout_file)
+        # Alarm on (1) or off (0) per port as last read or written, None if unknown
+        self.relay_state = None  # type: array | None
         self.total_packets = 0
         self.success_count = 0
         self.error_count = 0
+        self.on_progress = None  # Called after each XMODEM packet when set
+
+    def set_prompt(self, prompt: bytes) -> None:
+        """Build the prompts of each CLI mode from the prompt without "#"."""
+        self.prompt = prompt + self.p_end
+        self.cprompt = prompt + b"(config)" + self.p_end
+        self.iprompt = prompt + b"(config-if)" + self.p_end
+        self.vprompt = prompt + b"(config-vlan)" + self.p_end
 
     def vprint(self, text) -> None:
         """Print only when verbose is true."""
         if self.verbose is True:
             print(f"Moxalib: {text}")
 
-    def reset_conn(self) -> list:
-        """Reset Connection."""
+    def close(self) -> None:
+        """Close the serial port and save the learned timeouts."""
+        self.timeouts.save()
+        self.serial.close()
+
+    def read_until(self, terminator: bytes, kind: str = "show") -> bytes:
+        """
+        Read until terminator with the learned timeout of a command class.
+
+        Args:
+            terminator (bytes): what to stop at, usually a prompt
+            kind (str): command class, see TIMEOUT_CLASSES
+        Returns:
+            bytes: everything read
+        """
+        self.serial.timeout = self.timeouts.timeout(kind)
+        start = monotonic()
+        data = self.serial.read_until(terminator)
+        self.timeouts.record(kind, monotonic() - start, data.endswith(terminator))
+        self.serial.timeout = self.timeout
+        return data
+
+    def read_lines(self, kind: str, head: int, append: bool = False) -> memoryview:
+        """
+        Read up to the prompt with the learned timeout of a command class.
+
+        See SerialBuffer.read_lines, the prompt line is dropped.
+        """
+        self.serial.timeout = self.timeouts.timeout(kind)
+        start = monotonic()
+        data = self.reader.read_lines(self.prompt, head, append=append)
+        self.timeouts.record(kind, monotonic() - start, self.reader.found)
+        self.serial.timeout = self.timeout
+        return data
+
+    def reset_conn(self, attempts: int = 0) -> list:
+        """
+        Reset Connection.
+
+        Args:
+            attempts (int): reads before giving up, 0 is forever
+        Returns:
+            list: lines read, empty when nothing answered
+        """
         input_buffer = self.serial.readlines()
-        while not input_buffer:
+        while not input_buffer and attempts != 1:
+            attempts -= 1
             self.serial.setDTR(0)  # type: ignore
             sleep(0.5)
             self.serial.setDTR(1)  # type: ignore
             input_buffer = self.serial.readlines()
         return input_buffer
 
-    def check_login(self):
+    def check_login(self, attempts: int = 0):
         """
         Check if login mode is menu or cli.
 
+        Args:
+            attempts (int): reads before giving up, 0 is forever
         Returns:
-                (0 is menu, 1 is cli, -1 when nothing matched)
+                (0 is menu, 1 is cli, -1 when nothing matched,
+                 -2 when nothing answered)
         """
-        buffer = self.reset_conn()
+        buffer = self.reset_conn(attempts)
         returnval = expect(buffer, [b"vt52) : 1", b"login as:"])
         self.vprint(f"check_login function: {returnval}")
         return returnval
@@ -157,6 +505,8 @@ class Connection:
         self.serial.write("\n".encode("latin-1"))
         # Change terminal length to unlimited to dismiss pager
         self.serial.write(b"terminal length 0\n")
+        # Might be another switch on the cable now
+        self.relay_state = None
         # Clear buffer
         self.serial.readlines()[-1].decode("latin-1")
 
@@ -185,7 +535,7 @@ class Connection:
                   4: MAC Address, 5: Switch Uptime
         """
         self.serial.write(b"show system\n")
-        sysinfo = self.serial.read_until(self.prompt).decode("latin-1")
+        sysinfo = self.read_until(self.prompt).decode("latin-1")
         return_list = re.findall("(?<=: )(.*)\\r", sysinfo.strip())
         self.vprint(f"get_sysinfo function: {return_list}")
         return return_list
@@ -200,11 +550,33 @@ class Connection:
         """
         self.serial.flush()
         self.serial.write(b"show version\n")
-        version = self.serial.read_until(self.prompt).decode("latin-1")
+        version = self.read_until(self.prompt).decode("latin-1")
         return_list = re.findall("(?<=: )(.*)\\r", version.strip())
         self.vprint(f"get_version function: {return_list}")
         return return_list
 
+    def detect_profile(self) -> dict:
+        """
+        Pick the model profile from the CLI prompt and use that prompt.
+
+        The prompt is the model name, so every later read waits for the
+        prompt of the switch that is actually connected. The profile
+        stays as it was when no prompt is read.
+
+        Returns:
+            dict: see moxa_model_lib.make_profile
+        """
+        self.serial.write(b"\n")
+        lines = self.read_until(self.p_end).splitlines()
+        line = lines[-1].strip() if lines else b""
+        if line.endswith(self.p_end):
+            prompt = line[: -len(self.p_end)].split(b"(")[0]
+            self.set_prompt(prompt)
+            self.profile = profile_for(prompt.decode("latin-1"))
+        self.relay_state = None
+        self.vprint(f"detect_profile function: {self.profile['model']}")
+        return self.profile
+
     def get_ifaces(self) -> list:
         """
         Get status of interfaces, and returns it as a list.
@@ -214,12 +586,107 @@ class Connection:
         """
         self.serial.flush()
         self.serial.write(b"show interfaces ethernet\n")
-        return_list = re.findall(
-            "(?<=(?:1/.{3}))\\w+", self.serial.read_until(self.prompt).decode("latin-1")
-        )
+        return_list = port_column(self.read_until(self.prompt).decode("latin-1"), 5)
         self.vprint(f"get_ifaces function: {return_list}")
         return return_list
 
+    def round_trip(self, samples: int = 5) -> float:
+        """
+        Measure the console round trip with empty command lines.
+
+        Args:
+            samples (int): lines to send, the fastest answer counts
+        Returns:
+            float: seconds
+        """
+        best = float("inf")
+        for _ in range(samples):
+            start = monotonic()
+            self.serial.write(b"\n")
+            self.read_until(self.prompt)
+            best = min(best, monotonic() - start)
+        return best
+
+    def get_clock(self) -> int | None:
+        """
+        Get the switch time of day.
+
+        Returns:
+            int: seconds since midnight, None when not readable
+        """
+        self.serial.write(b"show clock\n")
+        clock = self.read_until(self.prompt).decode("latin-1")
+        match = re.search(r"(\d{1,2}):(\d{2}):(\d{2})", clock)
+        if match is None:
+            return None
+        hours, minutes, seconds = (int(value) for value in match.groups())
+        return hours * 3600 + minutes * 60 + seconds
+
+    def clock_offset(self, limit: float = 2.5) -> float | None:
+        """
+        Measure how far the switch clock is from ours.
+
+        The clock is polled until its seconds change, and the change is
+        placed halfway between the two polls around it, so the result is
+        better than the one second the clock shows.
+
+        Args:
+            limit (float): seconds to wait for the clock to tick
+        Returns:
+            float: seconds the switch is ahead, None when not readable
+        """
+        last = None
+        previous = 0.0
+        deadline = monotonic() + limit
+        while monotonic() < deadline:
+            sent = time()
+            value = self.get_clock()
+            middle = (sent + time()) / 2
+            if value is None:
+                return None
+            if last is not None and value != last:
+                tick = (previous + middle) / 2
+                local = localtime(tick)
+                ours = local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec
+                offset = value - ours - (tick % 1)
+                # Around midnight the time of day wraps
+                return (offset + 43200) % 86400 - 43200
+            last = value
+            previous = middle
+        return None
+
+    def set_clock(self, samples: int = 5) -> float | None:
+        """
+        Set the switch clock to ours, compensating for the console delay.
+
+        The command is sent so that its line end arrives on a whole
+        second, the time it sets. The offset is measured afterwards.
+        Time is local time, as used by the event log.
+
+        Args:
+            samples (int): round trip samples, see round_trip
+        Returns:
+            float: seconds the switch is ahead afterwards, None when the
+                   clock could not be read back
+        """
+        # Half the round trip plus sending the command, 10 bits per byte
+        length = len(strftime(CLOCK_SET))
+        delay = self.round_trip(samples) / 2 + length * 10 / self.baud
+        self.serial.write(b"configure\n")
+        self.read_until(self.cprompt, "config")
+        target = int(time() + delay) + 1
+        if target - delay - time() < 0.05:
+            target += 1
+        command = strftime(CLOCK_SET, localtime(target))
+        sleep(max(0.0, target - delay - time()))
+        self.serial.write(command.encode("latin-1"))
+        self.read_until(self.cprompt, "config")
+        self.serial.write(b"exit\n")
+        self.read_until(self.prompt, "config")
+        offset = self.clock_offset()
+        self.vprint(f"set_clock function: delay {delay:.4f}, offset {offset}")
+        return offset
+
     def get_portconfig(self) -> list:
         """
         Get the relay warning settings of the interfaces and returns it as a list.
@@ -228,10 +695,8 @@ class Connection:
             list: Relay warning status of all interfaces
         """
         self.serial.write(b"show relay-warning config\n")
-        return_list = re.findall(
-            "(?<=(?:1/.).{10})\\w+",
-            self.serial.read_until(self.prompt).decode("latin-1"),
-        )
+        return_list = port_column(self.read_until(self.prompt).decode("latin-1"), 13)
+        self.relay_state = alarm_array(return_list)
         self.vprint(f"get_portconfig function: {return_list}")
         return return_list
 
@@ -249,7 +714,7 @@ class Connection:
                   8: IPv6 link local address
         """
         self.serial.write(b"show interfaces mgmt\n")
-        ipinfo = self.serial.read_until(self.prompt).decode("latin-1")
+        ipinfo = self.read_until(self.prompt).decode("latin-1")
         return_list = re.findall("(?<=: )(.*)\\r", ipinfo.strip())
         self.vprint(f"get_ip function: {return_list}")
         return return_list
@@ -263,30 +728,47 @@ class Connection:
         """
         Configure alarm for interfaces in list. value == 1 is alarm on.
 
+        Only ports whose relay-warning setting differs from the known
+        state are sent, all in one batch answered by a single prompt, so
+        the number of round trips does not grow with the port count.
+        The state is read with get_portconfig first if it is not known.
+        Interface names come from the model profile.
+
         Args:
-            alarm (list): interfaces with alarm on or off
+            alarm (list): interfaces with alarm on or off, any port count
         """
-        self.serial.write(b"configure\n")
-        self.serial.read_until(self.cprompt)
+        if self.relay_state is None or len(self.relay_state) < len(alarm):
+            self.get_portconfig()
+        state = self.relay_state if self.relay_state is not None else array("B")
+        names = self.profile["names"]
+        batch = []
+        changed = []
         for count, iface in enumerate(alarm):
-            self.serial.write(
-                b"interface ethernet 1/" + str(count + 1).encode("latin-1") + b"\n"
-            )
-            self.serial.read_until(self.iprompt)
-            if iface == 1:
-                self.vprint(f"conf_iface function: set alarm on iface{count + 1} ON")
-                self.serial.write(b"relay-warning event link-off\n")
-                self.serial.read_until(self.iprompt)
-                self.serial.write(b"exit\n")
-                self.serial.read_until(self.cprompt)
+            wanted = 1 if iface == 1 else 0
+            if count < len(state) and state[count] == wanted:
+                continue
+            name = names[count] if count < len(names) else f"1/{count + 1}"
+            self.vprint(f"conf_iface function: alarm on {name} {wanted}")
+            batch.append(b"interface ethernet " + name.encode("latin-1") + b"\n")
+            if wanted:
+                batch.append(b"relay-warning event link-off\n")
             else:
-                self.vprint(f"conf_iface function: set alarm on iface{count + 1} OFF")
-                self.serial.write(b"no relay-warning event link\n")
-                self.serial.read_until(self.iprompt)
-                self.serial.write(b"exit\n")
-                self.serial.read_until(self.cprompt)
-        self.serial.write(b"exit\n")
-        self.serial.read_until(self.prompt)
+                batch.append(b"no relay-warning event link\n")
+            batch.append(b"exit\n")
+            changed.append((count, wanted))
+        if not changed:
+            self.vprint("conf_iface function: nothing to change")
+            return
+        self.serial.write(b"configure\n")
+        self.read_until(self.cprompt, "config")
+        self.serial.write(b"".join(batch) + b"exit\n")
+        self.read_until(self.prompt, "batch")
+        if len(state) < len(alarm):
+            # Ports the switch did not list, read again next time
+            self.relay_state = None
+            return
+        for count, wanted in changed:
+            state[count] = wanted
 
     def conf_ip(self, ip_add: str) -> int:
         """
@@ -304,20 +786,39 @@ class Connection:
         except ValueError:
             return 1
         self.serial.write(b"configure\n")
-        self.serial.read_until(self.cprompt)
+        self.read_until(self.cprompt, "config")
         self.serial.write(b"interface mgmt\n")
-        self.serial.read_until(self.vprompt)
+        self.read_until(self.vprompt, "config")
         self.serial.write(
             b"ip address static " + ip_add.encode("latin-1") + b" 255.255.255.0\n"
         )
         self.serial.write(b"exit\n")
         self.serial.write(b"exit\n")
-        self.serial.read_until(self.prompt)
-        if self.get_ip()[2] != ip_add.encode("latin-1"):
+        self.read_until(self.prompt, "config")
+        if self.get_ip()[2] == ip_add:
             self.vprint(f"conf_ip function: set: {ip_add}")
-            return 0
+            return -1
         self.vprint("conf_ip function: Failure")
-        return -1
+        return 0
+
+    def conf_commands(self, commands: list) -> None:
+        """
+        Send configure mode commands in one batch.
+
+        The commands are written together and only the final prompt is
+        waited for, so a batch costs one round trip.
+
+        Args:
+            commands (list): command lines as bytes, without newline
+        """
+        self.serial.write(b"configure\n")
+        self.read_until(self.cprompt, "config")
+        self.serial.write(b"".join(command + b"\n" for command in commands))
+        self.serial.write(b"exit\n")
+        self.read_until(self.prompt, "batch")
+        # Relay settings may have changed behind our back
+        self.relay_state = None
+        self.vprint(f"conf_commands function: sent {len(commands)} commands")
 
     def conf_hostname(self, hostname: str) -> None:
         """
@@ -327,11 +828,11 @@ class Connection:
             hostname (str): Hostname to switch to
         """
         self.serial.write(b"configure\n")
-        self.serial.read_until(self.cprompt)
+        self.read_until(self.cprompt, "config")
         self.serial.write(b"hostname " + hostname.encode("latin-1") + b"\n")
-        self.serial.read_until(self.cprompt)
+        self.read_until(self.cprompt, "config")
         self.serial.write(b"exit\n")
-        self.serial.read_until(self.prompt)
+        self.read_until(self.prompt, "config")
         self.vprint(f"conf_hostname function: set {hostname}")
 
     def conf_location(self, location: str) -> None:
@@ -341,18 +842,19 @@ class Connection:
             location (str): location string to switch to
         """
         self.serial.write(b"configure\n")
-        self.serial.read_until(self.cprompt)
+        self.read_until(self.cprompt, "config")
         self.serial.write(b"snmp-server location " + location.encode("latin-1") + b"\n")
-        self.serial.read_until(self.cprompt)
+        self.read_until(self.cprompt, "config")
         self.serial.write(b"exit\n")
-        self.serial.read_until(self.prompt)
+        self.read_until(self.prompt, "config")
         self.vprint(f"conf_location function: set to: {location}")
 
     def factory_conf(self) -> None:
         """Reset device to factory defaults."""
         self.serial.write(b"reload factory-default\n")
-        self.serial.read_until(b"Proceed with reload to factory default? [Y/n]")
+        self.read_until(b"Proceed with reload to factory default? [Y/n]", "reload")
         self.serial.write(b"Y")
+        self.relay_state = None
         self.vprint("factory_conf function: Factory defaults set")
 
     def save_run2startup(self) -> bool:
@@ -364,7 +866,7 @@ class Connection:
                           False = Failure
         """
         self.serial.write(b"save\n")
-        rval = self.serial.read_until(self.prompt)
+        rval = self.read_until(self.prompt, "save")
         if rb"Success" in rval:
             self.vprint("Saving running config to startup: Success")
             return True
@@ -378,12 +880,71 @@ class Connection:
             config (str)
         """
         self.serial.write(b"show startup-config\n")
-        config = self.serial.readlines()[3:-1]
-        config_dec = []
-        for items in config:
-            config_dec.append(items.decode("latin-1"))
-        configstring = "".join(config_dec)
-        return configstring  # [3:-1]
+        config = self.read_lines("dump", 3)
+        return str(config, "latin-1")
+
+    def stream_config(
+        self, sink, command: bytes = b"show startup-config\n", head: int = 3
+    ) -> int:
+        """
+        Write a config to sink as it arrives, without the echo and prompt.
+
+        At most one partial line is held back, so memory use does not
+        grow with the size of the config.
+
+        Args:
+            sink: binary file-like object with write()
+            command (bytes): show command to run
+            head (int): lines to drop at the start (command echo)
+        Returns:
+            int: bytes written
+        Raises:
+            RuntimeError: when the port timed out before the prompt, the
+                          partial config is written to sink first
+        """
+        self.serial.timeout = self.timeouts.timeout("dump")
+        start = monotonic()
+        self.serial.write(command)
+        pending = bytearray()
+        written = 0
+        found = False
+        while not found:
+            chunk = self.serial.read(self.serial.in_waiting or 1)
+            if not chunk:
+                break
+            pending += chunk
+            while head and b"\n" in pending:
+                del pending[: pending.index(b"\n") + 1]
+                head -= 1
+            if head:
+                continue
+            prompt = pending.find(self.prompt)
+            if prompt != -1:
+                found = True
+                end = pending.rfind(b"\n", 0, prompt) + 1
+            else:
+                end = pending.rfind(b"\n") + 1
+            if end:
+                written += sink.write(pending[:end])
+                del pending[:end]
+        self.timeouts.record("dump", monotonic() - start, found)
+        self.serial.timeout = self.timeout
+        self.vprint(f"stream_config function: {written} bytes")
+        if not found:
+            if pending:
+                written += sink.write(pending)
+            raise RuntimeError(f"config incomplete, no prompt after {written} bytes")
+        return written
+
+    def get_running_config(self) -> str:
+        """Get the running config and returns it as a decoded string.
+
+        Returns:
+            config (str)
+        """
+        self.serial.write(b"show running-config\n")
+        config = self.read_lines("dump", 3)
+        return str(config, "latin-1")
 
     def compare_config(self) -> int:
         """Compare the running and startup config and returns status.
@@ -393,10 +954,10 @@ class Connection:
                            0 = Mismatch
         """
         self.serial.write(b"show startup-config\n")
-        startup = self.serial.readlines()[3:-1]
+        startup = self.read_lines("dump", 3)
         self.serial.write(b"show running-config\n")
-        running = self.serial.readlines()[3:-1]
-        self.vprint(f"compare_config function: {running}")
+        running = self.read_lines("dump", 3, append=True)
+        self.vprint(f"compare_config function: {len(running)} bytes")
         if startup == running:
             return -1
         return 0
@@ -410,25 +971,23 @@ class Connection:
         """
         self.vprint("get_eventlog function: ")
         self.serial.write(b"show logging event-log\n")
-        eventlog = self.serial.readlines()[1:-1]
-        eventlog_dec = []
-        for items in eventlog:
-            eventlog_dec.append(items.decode("latin-1"))
-        eventstring = "".join(eventlog_dec).rstrip()
+        eventlog = self.read_lines("dump", 1)
+        eventstring = str(eventlog, "latin-1").rstrip()
         self.vprint(eventstring)
         return eventstring
 
     def clear_eventlog(self) -> None:
         """Clear the eventlog."""
         self.serial.write(b"clear logging event-log\n")
-        self.serial.read_until(self.prompt)
+        self.read_until(self.prompt)
 
-    def copy_firmware(self, file: str) -> bool:
+    def xmodem_send(self, command: bytes, stream) -> bool:
         """
-        Send firmware file to device.
+        Start an XMODEM import on the device and send stream.
 
         Args:
-            file str: filelocation with full path
+            command (bytes): copy command starting the import
+            stream: binary file-like object to send
         Returns:
             status (bool): True for success
                            False for failure
@@ -454,13 +1013,55 @@ class Connection:
                 f" Success Count: {self.success_count},"
                 f" Error Count: {self.error_count}"
             )
+            if self.on_progress is not None:
+                self.on_progress()
 
-        self.serial.write(b"copy xmodem device-firmware\n")
+        self.serial.write(command)
         self.serial.write(NAK)  # send ^U (NAK)
         self.serial.readlines()  # empty buffer, ready to send
         modem = XMODEM(getc, putc)
+        return modem.send(stream, retry=8, callback=progress)
+
+    def copy_firmware(self, file: str) -> bool:
+        """
+        Send firmware file to device.
+
+        Args:
+            file str: filelocation with full path
+        Returns:
+            status (bool): True for success
+                           False for failure
+        """
         with open(file, "rb") as stream:
-            return modem.send(stream, retry=8, callback=progress)
+            return self.xmodem_send(b"copy xmodem device-firmware\n", stream)
+
+    def send_firmware(self, firmware: bytes) -> bool:
+        """
+        Send firmware contents to device, for callers without the file.
+
+        Args:
+            firmware (bytes): firmware file contents
+        Returns:
+            status (bool): True for success
+                           False for failure
+        """
+        return self.xmodem_send(b"copy xmodem device-firmware\n", BytesIO(firmware))
+
+    def copy_config(self, config: bytes) -> bool:
+        """
+        Send a complete config file to the device in one transfer.
+
+        The switch restarts with the imported config afterwards.
+
+        Args:
+            config (bytes): config file contents
+        Returns:
+            status (bool): True for success
+                           False for failure
+        """
+        self.relay_state = None
+        self.vprint(f"copy_config function: sending {len(config)} bytes")
+        return self.xmodem_send(b"copy xmodem config-file\n", BytesIO(config))
 
 
 if __name__ == "__main__":
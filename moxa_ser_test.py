@@ -3,6 +3,8 @@
 from ipaddress import ip_address
 from time import sleep
 
+from moxa_model_lib import profile_for
+
 
 def expect(buffer: list, wtf: list) -> int:
     """
@@ -17,6 +19,8 @@ def expect(buffer: list, wtf: list) -> int:
              -1 if nothing found,
              -2 if empty buffer
     """
+    if not buffer:
+        return -2
     findval = buffer[-1]
     for index, value in enumerate(wtf):
         if findval.find(value) != -1:
@@ -47,6 +51,17 @@ class Connection:
         self.cprompt = prompt + b"(config)" + self.p_end
         self.iprompt = prompt + b"(config-if)" + self.p_end
         self.vprompt = prompt + b"(config-vlan)" + self.p_end
+        self.model = prompt.decode()
+        self.ip = "192.168.127.253"
+        self.profile = profile_for(self.model)
+        self.running = (
+            "hostname Managed Redundant Switch 06113\n"
+            "snmp-server location Switch Location\n"
+            "interface mgmt\n"
+            " ip address static 192.168.127.253 255.255.255.0\n"
+            "!\n"
+        )
+        self.startup = self.running
         self.total_packets = 0
         self.success_count = 0
         self.error_count = 0
@@ -56,17 +71,35 @@ class Connection:
         if self.verbose is True:
             print(f"Moxalib: {text}")
 
-    def reset_conn(self) -> None:
+    def set_clock(self, samples: int = 5) -> float | None:
+        """
+        Set the switch clock to ours, compensating for the console delay.
+
+        Returns:
+            float: seconds the switch is ahead afterwards
+        """
+        _ = samples
+        self.vprint("set_clock function")
+        return 0.004
+
+    def close(self) -> None:
+        """Close the serial port."""
+        self.vprint("close function")
+
+    def reset_conn(self, attempts: int = 0) -> list:
         """Reset Connection."""
-        pass
+        _ = attempts
+        return [b"login as: "]
 
-    def check_login(self):
+    def check_login(self, attempts: int = 0):
         """
         Check if login mode is menu or cli.
 
         Returns:
-                (0 is menu, 1 is cli, -1 when nothing matched)
+                (0 is menu, 1 is cli, -1 when nothing matched,
+                 -2 when nothing answered)
         """
+        _ = attempts
         return_val = 1
         self.vprint(f"check_login function: {return_val}")
         return return_val
@@ -133,10 +166,21 @@ class Connection:
             list: Version info
                   0: Device Model, 1: Firmware Version
         """
-        return_list = ["EDS-408A-MM-SC", "V3.8"]
+        return_list = [self.model, "V3.8"]
         self.vprint(f"get_version function: {return_list}")
         return return_list
 
+    def detect_profile(self) -> dict:
+        """
+        Pick the model profile from show version.
+
+        Returns:
+            dict: see moxa_model_lib.make_profile
+        """
+        self.profile = profile_for(self.get_version()[0])
+        self.vprint(f"detect_profile function: {self.profile['model']}")
+        return self.profile
+
     def get_ifaces(self) -> list:
         """
         Get status of interfaces, and returns it as a list.
@@ -144,7 +188,7 @@ class Connection:
         Returns:
             list: Status of all interfaces
         """
-        return_list = ["Down", "Down", "Down", "Down", "Down", "Down", "Down", "Down"]
+        return_list = ["Down"] * self.profile["ports"]
         self.vprint(f"get_ifaces function: {return_list}")
         return return_list
 
@@ -164,7 +208,8 @@ class Connection:
             "Off",
             "Off",
             "Ignore",
-        ]
+        ] + ["Ignore"] * self.profile["ports"]
+        return_list = return_list[: self.profile["ports"]]
         self.vprint(f"get_portconfig function: {return_list}")
         return return_list
 
@@ -184,7 +229,7 @@ class Connection:
         return_list = [
             "1",
             "Static",
-            "192.168.127.253",
+            self.ip,
             "255.255.255.0",
             "0.0.0.0",
             "",
@@ -223,11 +268,30 @@ class Connection:
             ip_address(ip)
         except ValueError:
             return 1
-        if self.get_ip()[2] != ip:
+        self.ip = ip
+        if self.get_ip()[2] == ip:
             self.vprint(f"IP address set to: {ip}")
-            return 0
+            return -1
         self.vprint("IP address setting: Failure")
-        return -1
+        return 0
+
+    def conf_commands(self, commands: list) -> None:
+        """
+        Send configure mode commands in one batch.
+
+        Args:
+            commands (list): command lines as bytes, without newline
+        """
+        section = False
+        for command in commands:
+            line = command.decode("latin-1")
+            self.vprint(f"Command: {line}")
+            if line == "exit":
+                section = False
+                self.running += "!\n"
+                continue
+            self.running += (" " + line if section else line) + "\n"
+            section = section or line.startswith("interface")
 
     def conf_hostname(self, hostname: str) -> None:
         """
@@ -263,6 +327,7 @@ class Connection:
         rval = b"Success"
         if rb"Success" in rval:
             self.vprint("Saving running config to startup: Success")
+            self.startup = self.running
             return True
         else:
             self.vprint("Saving running config to startup: Failure")
@@ -275,8 +340,28 @@ class Connection:
         Returns:
             config (str)
         """
-        configstring = "test test test"
-        return configstring  # [3:-1]
+        return self.startup
+
+    def stream_config(
+        self, sink, command: bytes = b"show startup-config\n", head: int = 3
+    ) -> int:
+        """
+        Write a config to sink as it arrives, without the echo and prompt.
+
+        Returns:
+            int: bytes written
+        """
+        _ = command, head
+        return sink.write(self.running.encode("latin-1"))
+
+    def get_running_config(self) -> str:
+        """
+        Get the running config and return it as a decoded string.
+
+        Returns:
+            config (str)
+        """
+        return self.running
 
     def compare_config(self) -> int:
         """
@@ -297,7 +382,11 @@ class Connection:
             eventlog (list)
         """
         self.vprint("get_eventlog function: ")
-        eventstring = " test eventlog test"
+        eventstring = (
+            "Index  Bootup  Date        Time      Startup Time  Event\n"
+            "1      1       2023/01/01  00:00:02  0d0h0m2s      Cold start\n"
+            "2      1       2023/01/01  00:01:10  0d0h1m10s     Port 1 link on"
+        )
         self.vprint(eventstring)
         return eventstring
 
@@ -321,6 +410,35 @@ class Connection:
         sleep(20)
         return True
 
+    def send_firmware(self, firmware: bytes) -> bool:
+        """
+        Send firmware contents to device, for callers without the file.
+
+        Args:
+            firmware (bytes): firmware file contents
+        Returns:
+            status (bool): True for success
+                           False for failure
+        """
+        _ = firmware
+
+        self.vprint("send_firmware function:")
+        return True
+
+    def copy_config(self, config: bytes) -> bool:
+        """
+        Send a complete config file to the device in one transfer.
+
+        Args:
+            config (bytes): config file contents
+        Returns:
+            status (bool): True for success
+                           False for failure
+        """
+        self.vprint(f"copy_config function: sending {len(config)} bytes")
+        self.running = config.decode("latin-1")
+        return True
+
 
 if __name__ == "__main__":
     pass
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module to keep the site plan in a SQLite database."""
+import sqlite3
+import threading
+from csv import DictReader, DictWriter
+
+from moxa_csv_lib import validate_rows
+
+# Columns that get an index, in addition to (Cabinet, AP)
+INDEXED = ("Cabinet", "AP", "Switch IP address", "MAC M", "MAC R")
+
+# WHERE clauses for the (main, unconfigured) views, see moxa_csv_lib.views_of
+VIEWS = {
+    (True, False): ('"SW" = ?', ("1",)),
+    (False, False): ('"SW" = ? AND "DIPB" != ?', ("1", "")),
+    (True, True): ('"SW" = ? AND "DIPB" != ? AND "MAC M" = ?', ("1", "", "")),
+    (False, True): ('"SW" = ? AND "DIPR" != ? AND "MAC R" = ?', ("1", "", "")),
+}
+
+
+def quote(name: str) -> str:
+    """Quote a CSV header as a SQL identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SqlConfigFile:
+    """
+    Read, parse and write to a site plan database.
+
+    Same interface as moxa_csv_lib.ConfigFile, but (file) is a SQLite
+    database created with import_csv. The database runs in WAL mode, so
+    the GUI and headless workers can read while another one writes.
+    """
+
+    def __init__(self, timeout: float = 10) -> None:
+        """Initialize the class."""
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connect(self, file: str) -> sqlite3.Connection:
+        """Return this thread's connection to the database."""
+        connections = self.local.__dict__.setdefault("connections", {})
+        if file not in connections:
+            database = sqlite3.connect(file, timeout=self.timeout)
+            database.row_factory = sqlite3.Row
+            database.execute("PRAGMA journal_mode=WAL")
+            database.execute("PRAGMA synchronous=NORMAL")
+            connections[file] = database
+        return connections[file]
+
+    def import_csv(self, csvfile: str, file: str) -> int:
+        """
+        Create the database (file) from a site plan CSV.
+
+        input:
+            csvfile (str)
+            file (str) database to (re)create
+        Returns:
+            number of rows (int)
+        """
+        with open(csvfile, "r") as f:
+            csvobject = DictReader(f, delimiter=",", quotechar='"')
+            rows = list(csvobject)
+            fieldnames = list(csvobject.fieldnames or [])
+        columns = ", ".join(quote(name) + " TEXT" for name in fieldnames)
+        marks = ", ".join("?" for _ in fieldnames)
+        database = self.connect(file)
+        with database:
+            database.execute("DROP TABLE IF EXISTS plan")
+            database.execute(f"CREATE TABLE plan ({columns})")
+            database.executemany(
+                f"INSERT INTO plan VALUES ({marks})",
+                ([row[name] for name in fieldnames] for row in rows),
+            )
+            for name in INDEXED:
+                if name in fieldnames:
+                    database.execute(
+                        f"CREATE INDEX {quote('idx ' + name)} ON plan ({quote(name)})"
+                    )
+            database.execute('CREATE INDEX "idx key" ON plan ("Cabinet", "AP")')
+        return len(rows)
+
+    def export_csv(self, file: str, csvfile: str) -> None:
+        """
+        Write the database (file) back to a site plan CSV.
+
+        input:
+            file (str) database
+            csvfile (str)
+        """
+        cursor = self.connect(file).execute("SELECT * FROM plan ORDER BY rowid")
+        fieldnames = [column[0] for column in cursor.description]
+        with open(csvfile, "w", newline="") as f:
+            data = DictWriter(f, delimiter=",", quotechar='"', fieldnames=fieldnames)
+            data.writeheader()
+            data.writerows(dict(row) for row in cursor)
+
+    def query(self, file: str, where: str = "", args: tuple = ()) -> list:
+        """Return the plan rows matching a WHERE clause as dictionaries."""
+        sql = "SELECT * FROM plan"
+        if where:
+            sql += " WHERE " + where
+        cursor = self.connect(file).execute(sql + " ORDER BY rowid", args)
+        return [dict(row) for row in cursor]
+
+    def read_config(self, file: str) -> list:
+        """
+        Read the database and output dictionary.
+
+        input:
+            file (str) database
+        Outputs:
+            parsed dictionary(list)
+        """
+        return self.query(file)
+
+    def select(self, file: str, main: bool, unconfigured: bool) -> list:
+        """
+        Read the database and output the rows of one AutoConf view.
+
+        input:
+            file (str) database
+            main (bool) Main or Reserve switches
+            unconfigured (bool) only rows without a recorded MAC
+        Outputs:
+            parsed dictionary(list)
+        """
+        return self.query(file, *VIEWS[(main, unconfigured)])
+
+    def find(self, file: str, cabinet: str, ap: str) -> list:
+        """Return the rows for cabinet and AP."""
+        return self.query(file, '"Cabinet" = ? AND "AP" = ?', (cabinet, ap))
+
+    def find_ip(self, file: str, ip_add: str) -> list:
+        """Return the rows using a switch IP address."""
+        return self.query(file, '"Switch IP address" = ?', (ip_add,))
+
+    def find_mac(self, file: str, mac: str) -> list:
+        """Return the rows with a recorded MAC address."""
+        return self.query(file, '"MAC M" = ? OR "MAC R" = ?', (mac, mac))
+
+    def validate(self, file: str) -> list:
+        """
+        Check the database for conflicts, see moxa_csv_lib.validate_rows.
+
+        input:
+            file (str) database
+        Outputs:
+            problems (list)
+        """
+        return validate_rows(self.read_config(file))
+
+    def write_config(
+        self, file: str, cabinet: str, ap: str, mac: str, main: bool
+    ) -> None:
+        """
+        Write the MAC address to the database.
+
+        input:
+            file(str)
+            cabinet(str) row to change
+            mac(str) MAC to add row
+            main(bool) Main or Reserve Mac to add
+        """
+        column = quote("MAC M" if main else "MAC R")
+        database = self.connect(file)
+        with database:
+            database.execute(
+                f'UPDATE plan SET {column} = ? WHERE "Cabinet" = ? AND "AP" = ?',
+                (mac, cabinet, ap),
+            )
+
+    def flush(self) -> None:
+        """Nothing to flush, every write is committed."""
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module to notice USB serial adapters being plugged in and out."""
+import os
+from fnmatch import fnmatch
+from glob import glob
+
+# Kernel names of USB serial adapters
+PATTERNS = ("ttyUSB*", "ttyACM*")
+
+
+class DeviceWatcher:
+    """
+    Track the serial adapters present, by scanning sysfs.
+
+    Only /sys/class/tty entries backed by a device are counted, so stale
+    nodes are ignored. Where sysfs is missing (containers, other
+    systems) the device nodes in (devfs) are globbed instead. Nothing is
+    started in the background: the owner calls scan() as often as it
+    wants to notice changes.
+    """
+
+    def __init__(
+        self,
+        patterns: tuple = PATTERNS,
+        sysfs: str = "/sys/class/tty",
+        devfs: str = "/dev",
+    ) -> None:
+        """Initialize the class."""
+        self.patterns = patterns
+        self.sysfs = sysfs
+        self.devfs = devfs
+        self.devices = set()  # type: set[str]
+
+    def present(self) -> set:
+        """Return the device paths of the adapters plugged in now."""
+        try:
+            names = os.listdir(self.sysfs)
+        except OSError:
+            return {
+                path
+                for pattern in self.patterns
+                for path in glob(os.path.join(self.devfs, pattern))
+            }
+        return {
+            os.path.join(self.devfs, name)
+            for name in names
+            if any(fnmatch(name, pattern) for pattern in self.patterns)
+            and os.path.exists(os.path.join(self.sysfs, name, "device"))
+        }
+
+    def scan(self) -> tuple:
+        """
+        Compare the adapters present with the last scan.
+
+        Returns:
+            added (list), removed (list) device paths, sorted
+        """
+        devices = self.present()
+        added = sorted(devices - self.devices)
+        removed = sorted(self.devices - devices)
+        self.devices = devices
+        return added, removed
+
+
+if __name__ == "__main__":
+    pass
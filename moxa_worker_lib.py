@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""Module to run serial jobs on a background thread."""
+import queue
+import traceback
+from threading import Thread
+from time import monotonic
+
+
+class SerialWorker:
+    """
+    Run jobs against a Connection on one background thread.
+
+    Jobs are called as job(connection, *args) in the order they were
+    submitted, so commands never interleave on the console. Results are
+    queued and handed to their callbacks by poll(), which the owner
+    calls from its own thread (the Tk main loop uses after()).
+
+    When no connection is given, factory() is called on the worker
+    thread before the first job, so opening the port never blocks the
+    owner. A failed open is reported to the job's errback and retried
+    with the next job.
+    """
+
+    def __init__(self, connection=None, errback=None, factory=None) -> None:
+        """Initialize the class."""
+        self.connection = connection
+        self.errback = errback
+        self.factory = factory
+        self.jobs = queue.Queue()  # type: queue.Queue
+        self.results = queue.Queue()  # type: queue.Queue
+        self.pending = 0
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self) -> None:
+        """Work through the job queue."""
+        while True:
+            job, args, callback, errback, quiet = self.jobs.get()
+            try:
+                if self.connection is None and self.factory is not None:
+                    self.connection = self.factory()
+                result = job(self.connection, *args)
+            except Exception as error:  # noqa: B902 - handed to errback
+                self.results.put((errback or self.errback, error, quiet))
+            else:
+                self.results.put((callback, result, quiet))
+
+    def submit(self, job, *args, callback=None, errback=None, quiet=False) -> None:
+        """
+        Queue a job.
+
+        Args:
+            job (callable): called as job(connection, *args)
+            callback (callable): called with the result by poll()
+            errback (callable): called with the exception by poll()
+            quiet (bool): background job, not counted by busy()
+        """
+        if not quiet:
+            self.pending += 1
+        self.jobs.put((job, args, callback, errback, quiet))
+
+    def busy(self) -> bool:
+        """Return True while submitted jobs have not been delivered."""
+        return self.pending > 0
+
+    def poll(self) -> int:
+        """
+        Deliver finished jobs to their callbacks in the calling thread.
+
+        Exceptions raised by a callback, and failed jobs without an
+        errback, are printed so the remaining results are still delivered.
+
+        Returns:
+            int: number of jobs delivered
+        """
+        count = 0
+        while True:
+            try:
+                callback, value, quiet = self.results.get_nowait()
+            except queue.Empty:
+                return count
+            if not quiet:
+                self.pending -= 1
+            count += 1
+            try:
+                if callback is not None:
+                    callback(value)
+                elif isinstance(value, Exception):
+                    raise value
+            except Exception:  # noqa: B902 - one bad result must not stop the rest
+                traceback.print_exc()
+
+
+class PortMonitor:
+    """
+    Poll link status on a SerialWorker and publish the changes.
+
+    The owner calls tick() from the thread that polls the worker. Every
+    (interval) seconds a quiet get_ifaces job is queued, never more than
+    one at a time, and subscribers are called with a dictionary of
+    {port index: new status} for the ports that changed. The first
+    result reports every port.
+    """
+
+    def __init__(self, worker: SerialWorker, interval: float = 2.0) -> None:
+        """Initialize the class."""
+        self.worker = worker
+        self.interval = interval
+        self.state = None  # type: list[str] | None
+        self.subscribers = []  # type: list
+        self.running = False
+        self.in_flight = False
+        self.next_poll = 0.0
+
+    def subscribe(self, callback) -> None:
+        """Call callback(changes) whenever port status changes."""
+        self.subscribers.append(callback)
+
+    def start(self) -> None:
+        """Start polling on the next tick."""
+        self.running = True
+        self.next_poll = 0.0
+
+    def stop(self) -> None:
+        """Stop polling."""
+        self.running = False
+
+    def tick(self) -> None:
+        """Queue a status poll when one is due."""
+        if not self.running or self.in_flight or monotonic() < self.next_poll:
+            return
+        self.in_flight = True
+        self.worker.submit(
+            lambda conn: conn.get_ifaces(),
+            callback=self.polled,
+            errback=self.failed,
+            quiet=True,
+        )
+
+    def failed(self, error: Exception) -> None:
+        """Skip a failed poll, the next one is tried after (interval)."""
+        _ = error
+        self.in_flight = False
+        self.next_poll = monotonic() + self.interval
+
+    def polled(self, ifaces: list) -> None:
+        """Take the result of a status poll."""
+        self.in_flight = False
+        self.next_poll = monotonic() + self.interval
+        self.update(ifaces)
+
+    def update(self, ifaces: list) -> dict:
+        """
+        Take a new port status list and publish what changed.
+
+        Also used to feed results of get_ifaces calls made elsewhere.
+
+        Returns:
+            changes (dict)
+        """
+        old = self.state or []
+        changes = {}
+        for count, status in enumerate(ifaces):
+            if count >= len(old) or old[count] != status:
+                changes[count] = status
+        self.state = list(ifaces)
+        if changes:
+            for callback in self.subscribers:
+                callback(changes)
+        return changes
+
+
+if __name__ == "__main__":
+    pass
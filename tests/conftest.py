@@ -0,0 +1,6 @@
+# coding=utf-8
+"""Make the moxa modules importable from the tests."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Tests of config rendering, against the parser provisioning reads back with."""
+import pytest
+
+from moxa_conf_lib import (
+    PARALLEL_ROWS,
+    Template,
+    apply_state,
+    duplicate_names,
+    render_rows,
+    row_values,
+    write_configs,
+)
+from moxa_prov_lib import desired_state, parse_running_config
+
+ROW = {
+    "Cabinet": "K12",
+    "AP": "3",
+    "Switch IP address": "10.1.2.3",
+    "Position": "Hall 2 north",
+    "Alarm ports": "1 3",
+}
+
+
+def expected(row: dict, main: bool) -> dict:
+    """Return what parsing a rendered config of (row) should give."""
+    values = row_values(row, main)
+    return {
+        "hostname": values["hostname"],
+        "location": values["location"],
+        "ip": values["ip"],
+        "netmask": values["netmask"],
+        "alarms": {count: 1 for count, alarm in enumerate(values["alarms"]) if alarm},
+    }
+
+
+def test_render_parses_back():
+    """Values with spaces survive render and parse."""
+    ((name, text),) = render_rows([ROW], True)
+    assert name == "K12M"
+    names = row_values(ROW, True)["names"]
+    assert parse_running_config(text, names) == expected(ROW, True)
+
+
+def test_render_matches_apply_state():
+    """A rendered config and a patched one parse the same."""
+    ((_, text),) = render_rows([ROW], False)
+    values = row_values(ROW, False)
+    desired = desired_state(
+        values["hostname"],
+        values["location"],
+        values["ip"],
+        values["alarms"],
+        values["names"],
+    )
+    current = "hostname old\ninterface mgmt\n ip address dhcp\n!\n"
+    patched = apply_state(current, desired)
+    for line in text.splitlines()[:2]:
+        assert line in patched.splitlines()
+    names = values["names"]
+    assert parse_running_config(patched, names) == parse_running_config(text, names)
+
+
+def test_template_specs_and_conversions():
+    """Format specs and conversions work like str.format."""
+    text = "{port:>3}|{name!r}|{alarm}"
+    values = {"port": 7, "name": "1/7", "alarm": "x"}
+    assert Template(text).render(values) == text.format(**values)
+
+
+def test_template_nested_spec():
+    """Nested format specs are refused when compiling."""
+    with pytest.raises(ValueError, match="nested"):
+        Template("{port:{width}}")
+
+
+def test_template_missing_value():
+    """A field without a value is an error, not an empty string."""
+    with pytest.raises(KeyError):
+        Template("{hostname} {nothing}").render({"hostname": "K12M"})
+
+
+def test_render_rows_on_pool_keeps_order():
+    """Rendering on a process pool gives the same, ordered result."""
+    rows = [dict(ROW, Cabinet=f"K{count}") for count in range(PARALLEL_ROWS + 5)]
+    serial = render_rows(rows, True, workers=1)
+    assert render_rows(rows, True, workers=2) == serial
+    assert [name for name, _ in serial] == [f"K{count}M" for count in range(len(rows))]
+
+
+def test_duplicate_names_not_written(tmp_path):
+    """Rows rendering the same file are refused before anything is written."""
+    rendered = render_rows([ROW, ROW], True)
+    assert duplicate_names(rendered) == ["K12M"]
+    with pytest.raises(ValueError):
+        write_configs(rendered, str(tmp_path / "out"))
+    assert not (tmp_path / "out").exists()
+
+
+def test_write_configs_skips_unchanged(tmp_path):
+    """Only changed configs are written again."""
+    directory = str(tmp_path / "out")
+    rows = [ROW, dict(ROW, Cabinet="K13")]
+    assert write_configs(render_rows(rows, True), directory) == 2
+    assert write_configs(render_rows(rows, True), directory) == 0
+    rows[1]["Position"] = "Hall 3"
+    assert write_configs(render_rows(rows, True), directory) == 1
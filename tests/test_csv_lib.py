@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Tests of the site plan checks and the in-memory site plan."""
+import os
+import stat
+
+from moxa_csv_lib import SitePlan, validate_rows, views_of
+
+HEADER = "Cabinet,AP,SW,DIPB,DIPR,IBC IP address,Switch IP address,Position,MAC M,MAC R"
+
+
+def plan_row(cabinet: str, ip: str = "10.0.0.1", **fields) -> dict:
+    """Return a valid site plan row, changed by (fields)."""
+    row = {
+        "Cabinet": cabinet,
+        "AP": "1",
+        "SW": "1",
+        "DIPB": "x",
+        "DIPR": "x",
+        "IBC IP address": "10.0.0.100",
+        "Switch IP address": ip,
+        "Position": "Hall 2",
+        "MAC M": "",
+        "MAC R": "",
+    }
+    row.update(fields)
+    return row
+
+
+def write_plan(path, rows: list) -> str:
+    """Write rows as a site plan CSV, return its path."""
+    lines = [HEADER] + [",".join(row.values()) for row in rows]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_views_of():
+    """A row is in every view its switch and MAC columns allow."""
+    assert views_of(plan_row("A", SW="0")) == set()
+    assert views_of(plan_row("A")) == {
+        (True, False),
+        (False, False),
+        (True, True),
+        (False, True),
+    }
+    assert views_of(plan_row("A", DIPB="", DIPR="", **{"MAC M": "m"})) == {
+        (True, False)
+    }
+    assert views_of(plan_row("A", **{"MAC M": "m", "MAC R": "r"})) == {
+        (True, False),
+        (False, False),
+    }
+
+
+def test_validate_rows_valid():
+    """A clean plan has no problems."""
+    assert validate_rows([plan_row("A"), plan_row("B", "10.0.0.2")]) == []
+
+
+def test_validate_rows_conflicts():
+    """Duplicates are reported with the line they collide with."""
+    rows = [
+        plan_row("A", **{"MAC M": "m1"}),
+        plan_row("A", "10.0.0.1", **{"MAC R": "m1"}),
+        plan_row("B", "10.0.1.5", Position=""),
+        plan_row("C", "10.0.0.x", AP=""),
+        plan_row("D", "10.0.0.9", SW="0", **{"MAC M": "m1"}),
+    ]
+    assert validate_rows(rows) == [
+        "line 3: duplicate A AP 1 (line 2)",
+        "line 3: duplicate Switch IP address 10.0.0.1 (line 2)",
+        "line 3: MAC R m1 already recorded (line 2)",
+        "line 4: B has no Position",
+        "line 4: Switch IP address 10.0.1.5 not in the subnet of IBC IP address"
+        " 10.0.0.100",
+        "line 5: C has no AP",
+        "line 5: malformed Switch IP address '10.0.0.x'",
+    ]
+
+
+def test_journal_replayed_on_load(tmp_path):
+    """MACs journaled but not flushed are there after a restart."""
+    file = write_plan(tmp_path / "site.csv", [plan_row("A"), plan_row("B", "10.0.0.2")])
+    plan = SitePlan(file, batch=10)
+    plan.set_mac("A", "1", "m1", True)
+    plan.set_mac("B", "1", "r2", False)
+    assert "m1" not in open(file).read()
+    # A torn last line from a crash mid append is ignored
+    with open(file + ".journal", "a") as f:
+        f.write('{"cabinet": "B", "ap": "1", "mac": "m')
+    restarted = SitePlan(file)
+    assert restarted.find_mac("m1")[0]["Cabinet"] == "A"
+    assert restarted.find_mac("r2")[0]["Cabinet"] == "B"
+    assert restarted.pending == 2
+    assert [row["Cabinet"] for row in restarted.select(True, True)] == ["B"]
+
+
+def test_flush_writes_back(tmp_path):
+    """A flush writes the MACs to the CSV, keeps its mode, empties the journal."""
+    file = write_plan(tmp_path / "site.csv", [plan_row("A")])
+    os.chmod(file, 0o664)
+    plan = SitePlan(file, batch=2)
+    plan.set_mac("A", "1", "m1", True)
+    plan.set_mac("A", "1", "r1", False)
+    assert plan.pending == 0
+    assert os.path.getsize(file + ".journal") == 0
+    assert stat.S_IMODE(os.stat(file).st_mode) == 0o664
+    row = SitePlan(file).find("A", "1")[0]
+    assert (row["MAC M"], row["MAC R"]) == ("m1", "r1")
@@ -0,0 +1,54 @@
+# coding=utf-8
+"""Tests of the event log store."""
+import sqlite3
+
+from moxa_event_lib import EventStore
+
+LOG = (
+    "Index  Bootup  Date        Time      Startup Time  Event\n"
+    "------------------------------------------------------------\n"
+    "1      3       2024/05/01  10:00:00  0d0h1m2s      Port 1 link off\n"
+    "2      3       2024/05/01  10:00:00  0d0h1m2s      Port 1 link off\n"
+    "3      3       2024/05/01  10:00:05  0d0h1m7s      Port 1 link on\n"
+)
+
+
+def test_equal_lines_are_kept_apart(tmp_path):
+    """Equal messages in one second are two entries, a reread adds none."""
+    store = EventStore(str(tmp_path / "events.db"))
+    assert store.ingest("00:90:E8:00:00:01", "K12M", "X", LOG) == 3
+    assert store.ingest("00:90:E8:00:00:01", "K12M", "X", LOG) == 0
+    entries = store.query(text="link off")
+    assert [entry["idx"] for entry in entries] == [1, 2]
+
+
+def test_old_store_is_upgraded(tmp_path):
+    """A store keyed without idx gets the new key and keeps its entries."""
+    file = str(tmp_path / "events.db")
+    database = sqlite3.connect(file)
+    database.execute(
+        "CREATE TABLE events ("
+        " mac TEXT NOT NULL, hostname TEXT, site TEXT, idx INTEGER, bootup TEXT,"
+        " date TEXT, clock TEXT, uptime TEXT, event TEXT NOT NULL, severity TEXT,"
+        " stamp REAL, collected REAL,"
+        " UNIQUE (mac, bootup, date, clock, uptime, event))"
+    )
+    database.execute("CREATE INDEX events_stamp ON events (stamp)")
+    database.execute(
+        "INSERT INTO events VALUES"
+        " ('m', 'h', 'X', 1, '3', '2024/05/01', '10:00:00', '0d0h1m2s',"
+        " 'Port 1 link off', 'warning', 0, 0)"
+    )
+    database.commit()
+    database.close()
+    store = EventStore(file)
+    assert len(store.query()) == 1
+    assert store.ingest("m", "h", "X", LOG) == 2
+    indexes = store.connect().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    )
+    assert {row["name"] for row in indexes} == {
+        "events_stamp",
+        "events_mac",
+        "events_site",
+    }
@@ -0,0 +1,49 @@
+# coding=utf-8
+"""Tests of the job journal replay."""
+from moxa_journal_lib import FINISHED, JobJournal, target
+
+
+def test_target():
+    """Main and Reserve switches of a row are separate targets."""
+    assert target("K12", "3", True) == "K12/3/M"
+    assert target("K12", "3", False) == "K12/3/R"
+
+
+def test_replay_after_restart(tmp_path):
+    """A new journal on the same file knows what was done."""
+    file = str(tmp_path / "site.csv.jobs")
+    journal = JobJournal(file)
+    journal.record("A/1/M", "login", mac="m1")
+    journal.record("A/1/M", "hostname")
+    journal.record("A/1/M", "ip", ok=False, error="timeout")
+    journal.record("B/1/M", "login", mac="m2")
+    journal.record("B/1/M", FINISHED, mac="m2")
+    restarted = JobJournal(file)
+    assert restarted.completed("A/1/M", "m1") == {"login", "hostname"}
+    assert restarted.completed("A/1/M", "m3") == set()
+    assert not restarted.finished("A/1/M")
+    assert restarted.finished("B/1/M")
+    assert restarted.started("m1") == "A/1/M"
+    assert restarted.started("m2") is None
+
+
+def test_other_switch_starts_over(tmp_path):
+    """Steps done on one switch do not count for the next one."""
+    journal = JobJournal(str(tmp_path / "jobs"))
+    journal.record("A/1/M", "login", mac="m1")
+    journal.record("A/1/M", "hostname")
+    journal.record("A/1/M", "login", mac="m2")
+    assert journal.completed("A/1/M", "m2") == {"login"}
+    assert journal.started("m1") is None
+    assert journal.started("m2") is None
+
+
+def test_torn_line_ignored(tmp_path):
+    """A last line cut off by a crash is skipped on load."""
+    file = tmp_path / "jobs"
+    JobJournal(str(file)).record("A/1/M", "login", mac="m1")
+    with open(file, "a") as f:
+        f.write('{"time": 2, "target": "A/1/M", "step": "write_')
+    journal = JobJournal(str(file))
+    assert not journal.finished("A/1/M")
+    assert journal.completed("A/1/M", "m1") == {"login"}
@@ -0,0 +1,64 @@
+# coding=utf-8
+"""Tests of the console multiplexer, with the mock Connection behind it."""
+import threading
+
+import pytest
+
+import moxa_mux_lib
+import moxa_ser_test
+from moxa_prov_lib import login
+
+
+class Switch(moxa_ser_test.Connection):
+    """Mock switch counting the logins that reached the console."""
+
+    logins = 0
+
+    def check_login(self, attempts: int = 0):
+        """Count the login and answer like a cli login."""
+        Switch.logins += 1
+        return super().check_login(attempts)
+
+
+@pytest.fixture
+def mux(tmp_path, monkeypatch):
+    """Serve the mock switch on a socket, return the socket path."""
+    monkeypatch.setattr(moxa_mux_lib, "Connection", Switch)
+    Switch.logins = 0
+    path = str(tmp_path / "mux" / "moxa-mux.sock")
+    server = moxa_mux_lib.MuxServer(path, keepalive=60.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_login_is_kept_between_clients(mux):
+    """A second client finds the console logged in."""
+    first = moxa_mux_lib.MuxConnection("/dev/a", mux)
+    second = moxa_mux_lib.MuxConnection("/dev/a", mux)
+    assert login(first) == moxa_mux_lib.LOGGED_IN
+    assert login(second) == moxa_mux_lib.LOGGED_IN
+    assert Switch.logins == 1
+    first.close()
+    second.close()
+
+
+@pytest.mark.parametrize("method", ["copy_config", "send_firmware", "factory_conf"])
+def test_restart_clears_login(mux, method):
+    """After a call that restarts the switch the next login reaches it."""
+    conn = moxa_mux_lib.MuxConnection("/dev/a", mux)
+    login(conn)
+    args = () if method == "factory_conf" else (b"config",)
+    getattr(conn, method)(*args)
+    login(conn)
+    assert Switch.logins == 2
+    conn.close()
+
+
+def test_unknown_method_is_refused(mux):
+    """Only whitelisted Connection methods run on the daemon."""
+    conn = moxa_mux_lib.MuxConnection("/dev/a", mux)
+    with pytest.raises(RuntimeError, match="unknown method"):
+        conn.call("xmodem_send", b"x")
+    conn.close()
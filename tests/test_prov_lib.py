@@ -0,0 +1,124 @@
+# coding=utf-8
+"""Tests of the provisioning steps, on the mock Connection."""
+import pytest
+
+import moxa_prov_lib
+import moxa_ser_test
+from moxa_prov_lib import (
+    NO_ANSWER,
+    desired_state,
+    login,
+    parse_running_config,
+    plan_commands,
+    reconcile,
+)
+
+
+class MenuSwitch(moxa_ser_test.Connection):
+    """Mock switch in menu login that stops answering after the menu."""
+
+    def __init__(self) -> None:
+        """Initialize the class."""
+        super().__init__()
+        self.resets = []
+
+    def check_login(self, attempts: int = 0):
+        """Answer like a menu login."""
+        return 0
+
+    def reset_conn(self, attempts: int = 0) -> list:
+        """Record the attempts, read nothing."""
+        self.resets.append(attempts)
+        return []
+
+
+def test_login_gives_up_after_menu(monkeypatch):
+    """A switch gone silent after the menu login is reported, not waited for."""
+    monkeypatch.setattr(moxa_prov_lib, "sleep", lambda _: None)
+    conn = MenuSwitch()
+    assert login(conn, 0) == NO_ANSWER
+    assert conn.resets == [moxa_prov_lib.LOGIN_ATTEMPTS]
+
+
+RUNNING = (
+    'hostname "K12M"\n'
+    "snmp-server location Hall 2\n"
+    "interface mgmt\n"
+    " ip address static 10.1.2.3 255.255.255.0\n"
+    "!\n"
+    "interface ethernet 1/1\n"
+    " relay-warning event link-off\n"
+    "!\n"
+    "interface ethernet 1/3\n"
+    " no relay-warning event link\n"
+    "!\n"
+)
+
+
+def test_parse_running_config():
+    """The provisioned settings are read, quotes removed."""
+    assert parse_running_config(RUNNING) == {
+        "hostname": "K12M",
+        "location": "Hall 2",
+        "ip": "10.1.2.3",
+        "netmask": "255.255.255.0",
+        "alarms": {0: 1},
+    }
+
+
+def test_parse_running_config_names():
+    """Interface names map to ports through the profile."""
+    names = ["1/3", "1/1"]
+    assert parse_running_config(RUNNING, names)["alarms"] == {1: 1}
+
+
+def test_plan_commands_nothing_differs():
+    """A switch in the desired state needs no commands."""
+    desired = desired_state("K12M", "Hall 2", "10.1.2.3", [1, 0, 0])
+    assert plan_commands(parse_running_config(RUNNING), desired) == []
+
+
+def test_plan_commands_only_what_differs():
+    """Only changed settings and ports are sent."""
+    desired = desired_state("K12R", "Hall 2", "10.1.2.4", [1, 0, 1])
+    assert plan_commands(parse_running_config(RUNNING), desired) == [
+        b"hostname K12R",
+        b"interface mgmt",
+        b"ip address static 10.1.2.4 255.255.255.0",
+        b"exit",
+        b"interface ethernet 1/3",
+        b"relay-warning event link-off",
+        b"exit",
+    ]
+
+
+def test_reconcile_applies_and_saves():
+    """Differences are applied, verified and saved."""
+    conn = moxa_ser_test.Connection()
+    steps = {}
+    mac = reconcile(conn, "K12M", "Hall 2", "10.1.2.3", [1, 0, 0], steps)
+    assert mac == conn.get_sysinfo()[4]
+    assert set(steps) == {"read", "apply", "verify", "save", "mac"}
+    desired = desired_state("K12M", "Hall 2", "10.1.2.3", [1, 0, 0])
+    assert plan_commands(parse_running_config(conn.save_config()), desired) == []
+
+
+def test_reconcile_saves_unsaved_running_config():
+    """A running config that matches but was never saved gets saved."""
+    conn = moxa_ser_test.Connection()
+    conn.running = RUNNING
+    steps = {}
+    reconcile(conn, "K12M", "Hall 2", "10.1.2.3", [1, 0, 0], steps)
+    assert set(steps) == {"read", "startup", "save", "mac"}
+    assert conn.startup == RUNNING
+    steps = {}
+    reconcile(conn, "K12M", "Hall 2", "10.1.2.3", [1, 0, 0], steps)
+    assert set(steps) == {"read", "startup", "mac"}
+
+
+def test_reconcile_fails_when_not_taken():
+    """A switch that ignores the commands is reported."""
+    conn = moxa_ser_test.Connection()
+    conn.conf_commands = lambda commands: None
+    with pytest.raises(RuntimeError, match="did not take"):
+        reconcile(conn, "K12M", "Hall 2", "10.1.2.3", [1, 0, 0])
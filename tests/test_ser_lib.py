@@ -0,0 +1,116 @@
+# coding=utf-8
+"""Tests of the serial helpers that need no switch."""
+import pytest
+
+from moxa_ser_lib import TIMEOUT_CLASSES, SerialBuffer, Timeouts, parse_eventlog
+
+
+class FakeSerial:
+    """Serial port handing out prepared chunks, one per read."""
+
+    def __init__(self, chunks: list) -> None:
+        """Initialize the class."""
+        self.chunks = list(chunks)
+
+    @property
+    def in_waiting(self) -> int:
+        """Return the size of the next chunk."""
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size: int = 1) -> bytes:
+        """Return the next chunk, empty like a timeout when none is left."""
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def test_buffer_stops_at_terminator():
+    """A read ends at the chunk holding the terminator."""
+    buffer = SerialBuffer(FakeSerial([b"show x\r\nab", b"c\r\nSW#", b"late"]))
+    assert bytes(buffer.read_until(b"SW#")) == b"show x\r\nabc\r\nSW#"
+    assert buffer.found
+
+
+def test_buffer_terminator_split_over_chunks():
+    """A terminator arriving in two reads is still found."""
+    buffer = SerialBuffer(FakeSerial([b"abc S", b"W#", b"late"]))
+    assert bytes(buffer.read_until(b"SW#")) == b"abc SW#"
+
+
+def test_buffer_timeout():
+    """Everything read is returned when the terminator never comes."""
+    buffer = SerialBuffer(FakeSerial([b"abc", b"def"]))
+    assert bytes(buffer.read_until(b"SW#")) == b"abcdef"
+    assert not buffer.found
+
+
+def test_buffer_grows_and_keeps_views():
+    """Growing the buffer leaves earlier views intact."""
+    buffer = SerialBuffer(FakeSerial([b"x" * 10, b"SW#", b"y" * 40, b"SW#"]), 16)
+    first = buffer.read_until(b"SW#")
+    second = buffer.read_until(b"SW#", append=True)
+    assert bytes(first) == b"x" * 10 + b"SW#"
+    assert bytes(second) == b"y" * 40 + b"SW#"
+
+
+def test_buffer_read_lines():
+    """The echo and prompt lines are dropped."""
+    serial = FakeSerial([b"show x\r\n1/1 up\r\n1/2 down\r\nSW#"])
+    lines = SerialBuffer(serial).read_lines(b"SW#", head=1)
+    assert bytes(lines) == b"1/1 up\r\n1/2 down\r\n"
+
+
+def test_timeouts_start_until_learned():
+    """The starting value is used until enough samples are seen."""
+    timeouts = Timeouts("EDS@/dev/x", file=None, min_samples=5)
+    for _ in range(4):
+        timeouts.record("show", 0.1, True)
+    assert timeouts.timeout("show") == TIMEOUT_CLASSES["show"][0]
+    timeouts.record("show", 0.1, True)
+    assert timeouts.timeout("show") == pytest.approx(0.1 * 1.5 + 0.2)
+
+
+def test_timeouts_bounds_and_growth():
+    """Learned timeouts stay within floor and class maximum."""
+    timeouts = Timeouts("EDS@/dev/x", file=None, min_samples=1)
+    timeouts.record("config", 0.001, True)
+    assert timeouts.timeout("config") == pytest.approx(0.2015)
+    timeouts = Timeouts("EDS@/dev/x", file=None, min_samples=1)
+    timeouts.record("show", 100.0, True)
+    assert timeouts.timeout("show") == TIMEOUT_CLASSES["show"][1]
+    timeouts = Timeouts("EDS@/dev/x", file=None, min_samples=2)
+    timeouts.record("show", 0.1, True)
+    timeouts.record("show", 0.1, False)
+    # A timed out read counts twice the timeout it had
+    assert max(timeouts.samples["show"]) == 2 * TIMEOUT_CLASSES["show"][0]
+
+
+def test_timeouts_saved_per_key(tmp_path):
+    """Samples are saved and loaded per key, other keys are kept."""
+    file = str(tmp_path / "timeouts.json")
+    first = Timeouts("A@/dev/x", file=file, save_every=2)
+    second = Timeouts("B@/dev/y", file=file, save_every=1)
+    first.record("dump", 3.0, True)
+    first.record("dump", 3.0, True)
+    second.record("save", 9.0, True)
+    assert list(Timeouts("A@/dev/x", file=file).samples["dump"]) == [3.0, 3.0]
+    assert list(Timeouts("B@/dev/y", file=file).samples["save"]) == [9.0]
+
+
+def test_timeouts_unwritable_file(tmp_path):
+    """Saving to a missing directory keeps the samples in memory."""
+    timeouts = Timeouts("A", file=str(tmp_path / "none" / "t.json"), save_every=1)
+    timeouts.record("show", 0.5, True)
+    assert list(timeouts.samples["show"]) == [0.5]
+
+
+def test_parse_eventlog():
+    """Entries are parsed, headers skipped, short lines kept as events."""
+    eventlog = (
+        "Index  Bootup  Date        Time      Startup Time  Event\n"
+        "------------------------------------------------------------\n"
+        "1      3       2024/05/01  10:00:00  0d0h1m2s      Port 1 link off\n"
+        "2      Cold start\n"
+    )
+    assert parse_eventlog(eventlog) == [
+        [1, "3", "2024/05/01", "10:00:00", "0d0h1m2s", "Port 1 link off"],
+        [2, "", "", "", "", "Cold start"],
+    ]